@@ -0,0 +1,240 @@
+"""Module for policies that balance a simulation by adapting its transitions."""
+from math import ceil
+
+import arc
+import place
+import transition
+
+
+class AdaptPolicy():
+    """Parent class for all adapt policies."""
+
+    min_transitions = 2
+
+    def adapt(self, sim):
+        """Abstract method to add/remove transitions of sim to balance it."""
+        raise NotImplementedError
+
+    def needs_adapt(self, sim):
+        """Return True if an adapt pass could change anything."""
+        return True
+
+    def _set_apartment_modes(self, sim, mode):
+        """Set the mode of every apartment in sim."""
+        for trans in sim.get_transitions():
+            if isinstance(trans, transition.Apartment):
+                trans.set_mode(mode)
+
+    def _ensure_min_transitions(self, sim):
+        """Add one transition of each type that has too few.
+
+        At most one per type is added in a pass, so a larger shortfall is
+        made up over several passes.
+        """
+        for trans_type in (transition.Apartment, transition.Factory,
+                           transition.Farmland, transition.Foodcourt):
+            if (sim.get_num_of_transitions(trans_type)
+                    < AdaptPolicy.min_transitions):
+                sim.add_transition(trans_type(sim.get_gui, sim.get_arc))
+
+
+class ThresholdPolicy(AdaptPolicy):
+    """Add or remove one transition per place outside its thresholds."""
+
+    def needs_adapt(self, sim):
+        """Return True if an adapt pass would change anything.
+
+        That is when a place is outside its thresholds, or when the road is
+        back within them and some apartment is not yet neutral.
+        """
+        if any(place_.get_threshold_state for place_
+               in (sim.get_road, sim.get_shed, sim.get_magazine)):
+            return True
+        return any(isinstance(trans, transition.Apartment)
+                   and trans.get_mode != transition.ApartmentMode.NEUTRAL
+                   for trans in sim.get_transitions())
+
+    def adapt(self, sim):
+        """Add/remove transitions or change apartment priority to balance the system."""
+        gui = sim.get_gui
+        arc_ = sim.get_arc
+        # Check if any resources need to adapt
+        # ROADS - Controlled with apartments
+        if sim.get_road.need_to_adapt():
+            # If there are too few workers, focus on reproduction or add one apartment
+            if sim.get_road.get_amount < place.Place.threshold_min:
+                for trans in sim.get_transitions():
+                    if isinstance(trans, transition.Apartment):
+                        if trans.get_mode == transition.ApartmentMode.MULTIPLY:
+                            apartment = transition.Apartment(gui, arc_)
+                            apartment.set_mode(
+                                transition.ApartmentMode.MULTIPLY)
+                            sim.add_transition(apartment)
+                            break
+                        trans.set_mode(transition.ApartmentMode.MULTIPLY)
+
+            # If there are too many workers, focus on resting or remove one apartment
+            else:
+                for trans in sim.get_transitions():
+                    if isinstance(trans, transition.Apartment):
+                        if trans.get_mode == transition.ApartmentMode.REST:
+                            sim.remove_transition(trans)
+                            break
+                        trans.set_mode(transition.ApartmentMode.REST)
+        # If there are enough workers, return apartments to neutral state.
+        else:
+            self._set_apartment_modes(sim, transition.ApartmentMode.NEUTRAL)
+
+        # SHEDS - Controlled with farmlands and foodcourts
+        if sim.get_shed.need_to_adapt():
+            # If there are too few food, remove a foodcourt if possible, otherwise add a farmland
+            if sim.get_shed.get_amount < place.Place.threshold_min:
+                if sim.get_num_of_transitions(transition.Foodcourt) > 2:
+                    foodcourt = sim.get_transition(transition.Foodcourt)
+                    sim.remove_transition(foodcourt)
+                else:
+                    sim.add_transition(transition.Farmland(gui, arc_))
+            # If there are too many food, remove a farmland if possible, otherwise add a foodcourt
+            else:
+                if sim.get_num_of_transitions(transition.Farmland) > 2:
+                    farmland = sim.get_transition(transition.Farmland)
+                    sim.remove_transition(farmland)
+                else:
+                    sim.add_transition(transition.Foodcourt(gui, arc_))
+
+        # MAGAZINE - Controlled with factories primarily and apartments secondarily
+        if sim.get_magazine.need_to_adapt():
+            # If there are too many products, remove a factory is possible, otherwise add an apartment
+            if sim.get_magazine.get_amount > place.Place.threshold_max:
+                if sim.get_num_of_transitions(transition.Factory) > 2:
+                    factory = sim.get_transition(transition.Factory)
+                    sim.remove_transition(factory)
+                else:
+                    sim.add_transition(transition.Apartment(gui, arc_))
+            # If there are too few products, add a factory
+            else:
+                sim.add_transition(transition.Factory(gui, arc_))
+
+        # Check if there are enough of each transition
+        self._ensure_min_transitions(sim)
+
+
+class RatePolicy(AdaptPolicy):
+    """Size each transition type to match the measured demand.
+
+    Firing rates per transition are estimated from the firings since the
+    previous pass and smoothed. Producers (farmlands, factories) are sized
+    to cover the consumption of the consumers (foodcourts, apartments) plus
+    the flow needed to bring the place back to the middle of its
+    thresholds within horizon seconds. When even the minimum number of
+    producers overproduces, consumers are added to absorb the surplus,
+    consumers are never reduced. Counts move at most max_step per pass
+    and only when the target differs by more than deadband transitions or
+    deadband_ratio of the current count, which keeps transition churn low.
+    """
+
+    horizon = 30
+    smoothing = 0.3
+    max_step = 2
+    deadband = 1
+    deadband_ratio = 0.1
+
+    def __init__(self):
+        """Initialize rate policy."""
+        self._last_time = None
+        self._last_firings = {}
+        self._rates = {}
+
+    def adapt(self, sim):
+        """Resize transitions to match estimated production and consumption."""
+        self._update_rates(sim)
+        self._adapt_road(sim)
+        self._adapt_place(sim, sim.get_shed,
+                          transition.Farmland, transition.Foodcourt)
+        self._adapt_place(sim, sim.get_magazine,
+                          transition.Factory, transition.Apartment)
+        self._ensure_min_transitions(sim)
+
+    def get_rate(self, trans_type):
+        """Return the estimated firings per second of one transition."""
+        return self._rates.get(trans_type) or self._nominal_rate(trans_type)
+
+    @staticmethod
+    def _nominal_rate(trans_type):
+        """Return the firing rate of one transition with no waiting for tokens."""
+        production_time = {
+            transition.Farmland: transition.Farmland.production_time,
+            transition.Foodcourt: transition.Foodcourt.production_time,
+            transition.Factory: transition.Factory.base_production_time,
+            transition.Apartment: transition.Apartment.rest_time,
+        }[trans_type]
+        # One fetch and one store per token moved, about three per firing
+        return 1 / (production_time + 3 * arc.Arc.transport_time)
+
+    def _update_rates(self, sim):
+        """Update the smoothed firing rate per transition of every type."""
+        now = sim.get_clock.now()
+        firings = {t: sim.get_firings(t) for t in transition.TRANSITION_TYPES}
+        if self._last_time is not None and now > self._last_time:
+            elapsed = now - self._last_time
+            for trans_type in transition.TRANSITION_TYPES:
+                count = sim.get_num_of_transitions(trans_type)
+                if not count:
+                    continue
+                sample = ((firings[trans_type] - self._last_firings[trans_type])
+                          / elapsed / count)
+                old = self._rates.get(trans_type, sample)
+                self._rates[trans_type] = (
+                    (1 - RatePolicy.smoothing) * old
+                    + RatePolicy.smoothing * sample)
+        self._last_time = now
+        self._last_firings = firings
+
+    def _adapt_road(self, sim):
+        """Steer reproduction with apartment modes."""
+        state = sim.get_road.get_threshold_state
+        if state < 0:
+            self._set_apartment_modes(sim, transition.ApartmentMode.MULTIPLY)
+        elif state > 0:
+            self._set_apartment_modes(sim, transition.ApartmentMode.REST)
+        else:
+            self._set_apartment_modes(sim, transition.ApartmentMode.NEUTRAL)
+
+    def _adapt_place(self, sim, place_, producer, consumer):
+        """Size producers and consumers so place_ settles mid-threshold."""
+        target_level = (place.Place.threshold_min + place.Place.threshold_max) / 2
+        wanted_inflow = (target_level - place_.get_amount) / RatePolicy.horizon
+        consumption = (sim.get_num_of_transitions(consumer)
+                       * self.get_rate(consumer))
+
+        producers = max((consumption + wanted_inflow) / self.get_rate(producer),
+                        AdaptPolicy.min_transitions)
+        self._resize(sim, producer, producers)
+
+        surplus = (AdaptPolicy.min_transitions * self.get_rate(producer)
+                   - consumption - wanted_inflow)
+        if producers == AdaptPolicy.min_transitions and surplus > 0:
+            consumers = (sim.get_num_of_transitions(consumer)
+                         + surplus / self.get_rate(consumer))
+            self._resize(sim, consumer, consumers)
+
+    def _resize(self, sim, trans_type, target):
+        """Move the number of trans_type transitions towards target."""
+        count = sim.get_num_of_transitions(trans_type)
+        if abs(target - count) <= max(RatePolicy.deadband,
+                                      RatePolicy.deadband_ratio * count):
+            return
+        change = max(-RatePolicy.max_step,
+                     min(RatePolicy.max_step, ceil(target) - count))
+        for _ in range(change):
+            sim.add_transition(trans_type(sim.get_gui, sim.get_arc))
+        for _ in range(-change):
+            if sim.get_num_of_transitions(trans_type) <= AdaptPolicy.min_transitions:
+                break
+            sim.remove_transition(sim.get_transition(trans_type))
+
+
+POLICIES = {
+    'threshold': ThresholdPolicy,
+    'rate': RatePolicy,
+}
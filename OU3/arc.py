@@ -1,56 +1,164 @@
 """Module for arc that handles transportation of tokens."""
-from threading import Event
+from threading import Lock
+
+# What a store does when its place is full
+BLOCK = 'block'
+REFUSE = 'refuse'
+
+
+def drive(steps, wait=None):
+    """Run a generator of wait durations to the end and return its value.
+
+    wait(duration) is called for every yielded duration. If wait is None
+    the generator runs without waiting.
+    """
+    try:
+        duration = next(steps)
+        while True:
+            if wait:
+                wait(duration)
+            duration = next(steps)
+    except StopIteration as stop:
+        return stop.value
 
 
 class Arc():
-    """Class to manage transportation of tokens."""
+    """Class to manage transportation of tokens.
+
+    All methods are generators that yield the transport time to wait
+    before the token is moved, use them with yield from.
+    """
 
     transport_time = 0.2
+    # Time a blocked store waits before it tries a full place again
+    retry_time = 0.5
+    # What a store does when its place is full, workers always wait
+    full_policy = BLOCK
 
     def __init__(self, sim):
         """Create an arc object."""
         self._sim = sim
-        self._timer = Event()
+        self._moves = 0
+        self._moves_lock = Lock()
+        # Place name -> simulated time producers spent blocked on it
+        self._blocked_time = {}
+        # Place name -> number of tokens refused by it
+        self._refused = {}
+
+    @property
+    def get_clock(self):
+        """Return the clock of the simulation."""
+        return self._sim.get_clock
+
+    @property
+    def get_token_pool(self):
+        """Return the token pool of the simulation."""
+        return self._sim.get_token_pool
+
+    @property
+    def get_recorder(self):
+        """Return the recorder of the simulation, None if it is not recorded."""
+        return self._sim.get_recorder
+
+    @property
+    def get_moves(self):
+        """Return the number of tokens moved by the arc."""
+        return self._moves
+
+    @property
+    def get_blocked_time(self):
+        """Return a dict of the time producers waited for room in each place."""
+        with self._moves_lock:
+            return dict(self._blocked_time)
+
+    @property
+    def get_refused(self):
+        """Return a dict of the number of tokens each full place refused."""
+        with self._moves_lock:
+            return dict(self._refused)
+
+    def _count_blocked(self, place, blocked_time, refused=0):
+        """Add blocked time and refused tokens to the metrics of place."""
+        name = type(place).__name__
+        with self._moves_lock:
+            self._blocked_time[name] = (self._blocked_time.get(name, 0)
+                                        + blocked_time)
+            self._refused[name] = self._refused.get(name, 0) + refused
 
-    def get_worker(self):
-        """Get a worker from the road. If the road is empty, return None."""
-        self._timer.wait(Arc.transport_time)
+    def _count_move(self, token, place):
+        """Count a token move to or from place and record it."""
+        with self._moves_lock:
+            self._moves += 1
+        if self._sim.get_recorder:
+            self._sim.get_recorder.place(place)
+
+    def _take(self, place, priority=None):
+        """Remove and return a token from place. Return None if it is empty."""
         try:
-            return self._sim.get_road.remove()
+            token = place.remove(priority)
         except RuntimeError:
             return None
+        self._count_move(token, place)
+        return token
+
+    def get_worker(self, priority=None):
+        """Get a worker from the road. If the road is empty, return None.
+
+        priority chooses the oldest, healthiest or weakest worker, see
+        worker_index. The oldest worker is taken if it is None.
+        """
+        yield Arc.transport_time
+        return self._take(self._sim.get_road, priority)
 
     def get_food(self):
         """Get a food from the shed. If the shed is empty, return None."""
-        self._timer.wait(Arc.transport_time)
-        try:
-            return self._sim.get_shed.remove()
-        except RuntimeError:
-            return None
+        yield Arc.transport_time
+        return self._take(self._sim.get_shed)
 
     def get_product(self):
         """Get product from the magazine. If magazine is empty, return None."""
-        self._timer.wait(Arc.transport_time)
-        try:
-            return self._sim.get_magazine.remove()
-        except RuntimeError:
-            return None
+        yield Arc.transport_time
+        return self._take(self._sim.get_magazine)
+
+    def _store(self, place, token, producer, refusable=True, on_added=None):
+        """Store a token in place. Return True if it was stored.
+
+        on_added is called with place locked once the token is in it, see
+        Place.add.
+
+        If place is full the store refuses a refusable token when
+        full_policy is REFUSE, otherwise it waits retry_time at a time until
+        there is room. Without a producer, or with a stopping one, the store
+        never waits or refuses and the token is stored over capacity
+        instead, so shutting down loses no tokens.
+        """
+        yield Arc.transport_time
+        while not place.try_add(token, on_added):
+            if producer is None or producer.is_stopping:
+                place.add(token, on_added)
+                break
+            if refusable and Arc.full_policy == REFUSE:
+                self._count_blocked(place, 0, 1)
+                return False
+            self._count_blocked(place, Arc.retry_time)
+            yield Arc.retry_time
+        self._count_move(token, place)
+        return True
 
-    def store_worker(self, worker):
-        """Store a worker on the road."""
-        self._timer.wait(Arc.transport_time)
-        self._sim.get_road.add(worker)
+    def store_worker(self, worker, producer=None, on_added=None):
+        """Store a worker on the road. Return True if it was stored.
 
-    def store_food(self, food):
-        """Store a food in the shed."""
-        self._timer.wait(Arc.transport_time)
-        self._sim.get_shed.add(food)
+        Workers are never refused, a full road makes the producer wait.
+        """
+        return (yield from self._store(self._sim.get_road, worker, producer,
+                                       False, on_added))
 
-    def store_product(self, product):
-        """Store a product in the magazine."""
-        self._timer.wait(Arc.transport_time)
-        self._sim.get_magazine.add(product)
+    def store_food(self, food, producer=None, on_added=None):
+        """Store a food in the shed. Return True if it was stored."""
+        return (yield from self._store(self._sim.get_shed, food, producer,
+                                       on_added=on_added))
 
-    def set_timer(self):
-        """Set the event timer to finish simulation."""
-        self._timer.set()
+    def store_product(self, product, producer=None, on_added=None):
+        """Store a product in the magazine. Return True if it was stored."""
+        return (yield from self._store(self._sim.get_magazine, product,
+                                       producer, on_added=on_added))
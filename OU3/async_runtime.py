@@ -0,0 +1,109 @@
+"""Module for a runtime driving transitions on an asyncio event loop."""
+import asyncio
+from threading import Thread
+
+
+class AsyncRuntime():
+    """Run every transition as a coroutine on one asyncio event loop.
+
+    The event loop runs in a single thread of its own. The transitions'
+    steps generators are driven by coroutines that await the yielded
+    durations, so a transition costs a task instead of an OS thread.
+    Durations are in simulated time of the clock given to start, sleeps
+    are rescaled when its time scale changes.
+    """
+
+    def __init__(self):
+        """Initialize async runtime."""
+        self._loop = None
+        self._thread = None
+        self._clock = None
+        self._tasks = {}
+        self._sleeping = {}
+
+    def start(self, clock):
+        """Start the event loop thread."""
+        self._clock = clock
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever,
+                              name='AsyncRuntime', daemon=True)
+        self._thread.start()
+        clock.add_listener(self._on_time_scale)
+
+    def start_transition(self, trans):
+        """Start running a transition as a task on the event loop."""
+        self._tasks[trans] = asyncio.run_coroutine_threadsafe(
+            self._run_transition(trans), self._loop)
+
+    def stop_transition(self, trans):
+        """Ask a transition to finish and wait until it has."""
+        trans.finish_thread()
+        task = self._tasks.pop(trans, None)
+        if task:
+            self._loop.call_soon_threadsafe(self._wake, trans)
+            task.result()
+
+    def close(self):
+        """Stop the event loop and its thread."""
+        for trans in list(self._tasks):
+            self.stop_transition(trans)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _run_transition(self, trans):
+        """Drive the steps of a transition, awaiting every yielded duration."""
+        steps = trans.steps()
+        try:
+            duration = next(steps)
+            while True:
+                await self._sleep(trans, duration)
+                duration = next(steps)
+        except StopIteration:
+            pass
+
+    async def _sleep(self, trans, duration):
+        """Sleep for duration simulated seconds unless the transition is stopping."""
+        if trans.is_stopping or duration <= 0:
+            await asyncio.sleep(0)
+            return
+        deadline = self._clock.now() + duration
+        while not trans.is_stopping:
+            remaining = deadline - self._clock.now()
+            if remaining <= 0:
+                break
+            scale = self._clock.get_time_scale
+            future = self._loop.create_future()
+            # A paused clock sleeps until _rescale resolves the future
+            handle = (self._loop.call_later(remaining / scale,
+                                            self._resolve, future)
+                      if scale else None)
+            self._sleeping[trans] = future
+            try:
+                await future
+            finally:
+                if handle:
+                    handle.cancel()
+                self._sleeping.pop(trans, None)
+
+    def _on_time_scale(self, time_scale):
+        """Rescale all sleeps on the event loop when the time scale changes."""
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._rescale)
+
+    def _rescale(self):
+        """End all current sleeps so they restart with the new time scale."""
+        for future in list(self._sleeping.values()):
+            self._resolve(future)
+
+    def _wake(self, trans):
+        """End the current sleep of a transition early."""
+        future = self._sleeping.get(trans)
+        if future:
+            self._resolve(future)
+
+    @staticmethod
+    def _resolve(future):
+        """Mark a sleep future as done."""
+        if not future.done():
+            future.set_result(None)
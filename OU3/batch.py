@@ -0,0 +1,223 @@
+"""Module for simulating many independent villages at once as count arrays.
+
+Every village is a marking of the compiled SimSims net plus the number of
+transitions of each type. All villages are advanced together by
+tau-leaping: in every step of tau simulated seconds the number of firings
+of each transition is drawn from a Poisson distribution and capped by the
+tokens available. Run as a script, for example:
+
+    python batch.py --villages 10000 --duration 3600
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import adapt_policy
+import petri_net
+import place
+
+
+class BatchSimulation():
+    """N villages following the SimSims rules, stepped with NumPy.
+
+    Tokens are only counted, tokens held inside transitions between
+    fetching and storing are not modelled. Transitions are adapted with
+    the rules of ThresholdPolicy every adapt_interval simulated seconds.
+    """
+
+    tau = 0.5
+    adapt_interval = 10
+
+    def __init__(self, num_villages, initial_workers=10, seed=None, net=None):
+        """Initialize batch simulation of num_villages identical villages."""
+        self._net = net or petri_net.PetriNet()
+        self._rng = np.random.default_rng(seed)
+        self._num_villages = num_villages
+
+        definition = self._net.get_definition
+        class_names = [trans.get_class_name
+                       for trans in definition.get_transitions]
+        self._classes = list(dict.fromkeys(class_names))
+        self._class_of = np.array([self._classes.index(name)
+                                   for name in class_names])
+        self._road = self._net.place_index('road')
+        self._shed = self._net.place_index('shed')
+        self._magazine = self._net.place_index('magazine')
+        self._rest = self._net.transition_index('apartment_rest')
+        self._multiply = self._net.transition_index('apartment_multiply')
+
+        self._marking = np.tile(self._net.marking(road=initial_workers),
+                                (num_villages, 1))
+        self._counts = np.full((num_villages, len(self._classes)),
+                               adapt_policy.AdaptPolicy.min_transitions,
+                               dtype=np.int64)
+        # Road threshold state steering the apartments: -1 multiply, 1 rest
+        self._apartment_mode = np.zeros(num_villages, dtype=np.int64)
+        self._firings = np.zeros((num_villages, len(self._class_of)),
+                                 dtype=np.int64)
+        self._time = 0.0
+        self._next_adapt = 0.0
+        self._steps = 0
+        self._population_sum = np.zeros(num_villages)
+        self._transitions_sum = np.zeros(num_villages)
+        self._survival_time = np.full(num_villages, np.nan)
+
+    @property
+    def get_time(self):
+        """Return the simulated time in seconds."""
+        return self._time
+
+    @property
+    def get_marking(self):
+        """Return the markings of all villages, one row per village."""
+        return self._marking.copy()
+
+    @property
+    def get_counts(self):
+        """Return the number of transitions per type in every village."""
+        return {name: self._counts[:, k].copy()
+                for k, name in enumerate(self._classes)}
+
+    @property
+    def get_population(self):
+        """Return the number of workers in every village."""
+        return self._marking[:, self._road].copy()
+
+    def _count(self, class_name):
+        """Return a view of the transition counts of one type."""
+        return self._counts[:, self._classes.index(class_name)]
+
+    def _apartment_shares(self):
+        """Return the share of apartment firings that rest or multiply."""
+        multiply = np.select([self._apartment_mode < 0,
+                              self._apartment_mode > 0], [1.0, 0.0], 0.5)
+        return 1 - multiply, multiply
+
+    def step(self):
+        """Advance all villages by tau simulated seconds."""
+        tau = BatchSimulation.tau
+        rates = (self._counts[:, self._class_of]
+                 / self._net.get_cycle_times)
+        rest, multiply = self._apartment_shares()
+        rates[:, self._rest] *= rest
+        rates[:, self._multiply] *= multiply
+
+        requested = self._rng.poisson(rates * tau)
+        firings = np.zeros_like(requested)
+        available = self._marking.copy()
+        pre = self._net.get_pre
+        # Transitions competing for tokens are served in random order
+        for t in self._rng.permutation(len(self._class_of)):
+            degree = self._net.enabling_degree(available, t)
+            firings[:, t] = np.minimum(requested[:, t], degree)
+            available -= firings[:, t, np.newaxis] * pre[t]
+
+        outcomes = self._net.sample_outcomes(firings, self._rng)
+        self._marking = self._net.fire(self._marking, firings, outcomes)
+        self._firings += firings
+        self._time += tau
+        self._steps += 1
+
+        population = self._marking[:, self._road]
+        self._population_sum += population
+        self._transitions_sum += self._counts.sum(axis=1)
+        died = (population == 0) & np.isnan(self._survival_time)
+        self._survival_time[died] = self._time
+
+    def adapt(self):
+        """Add/remove transitions in every village like ThresholdPolicy."""
+        state = np.select(
+            [self._marking < place.Place.threshold_min,
+             self._marking > place.Place.threshold_max], [-1, 1], 0)
+        road = state[:, self._road]
+        shed = state[:, self._shed]
+        magazine = state[:, self._magazine]
+        minimum = adapt_policy.AdaptPolicy.min_transitions
+        apartments = self._count('Apartment')
+        farmlands = self._count('Farmland')
+        foodcourts = self._count('Foodcourt')
+        factories = self._count('Factory')
+
+        # ROADS - a second pass in the same direction adds/removes an apartment
+        apartments += (road < 0) & (self._apartment_mode < 0)
+        apartments -= (road > 0) & (self._apartment_mode > 0)
+        self._apartment_mode = road.copy()
+
+        # SHEDS
+        remove_foodcourt = (shed < 0) & (foodcourts > minimum)
+        remove_farmland = (shed > 0) & (farmlands > minimum)
+        foodcourts -= remove_foodcourt
+        farmlands += (shed < 0) & ~remove_foodcourt
+        farmlands -= remove_farmland
+        foodcourts += (shed > 0) & ~remove_farmland
+
+        # MAGAZINE
+        remove_factory = (magazine > 0) & (factories > minimum)
+        factories -= remove_factory
+        apartments += (magazine > 0) & ~remove_factory
+        factories += magazine < 0
+
+        np.maximum(self._counts, minimum, out=self._counts)
+
+    def run(self, duration):
+        """Run all villages for duration simulated seconds."""
+        end = self._time + duration
+        while self._time < end - 1e-9:
+            if self._time >= self._next_adapt - 1e-9:
+                self.adapt()
+                self._next_adapt += BatchSimulation.adapt_interval
+            self.step()
+
+    def summary(self):
+        """Return per village statistics as NumPy arrays."""
+        steps = max(self._steps, 1)
+        extinct = ~np.isnan(self._survival_time)
+        summary = {
+            'survival_time': np.where(extinct, self._survival_time,
+                                      self._time),
+            'extinct': extinct,
+            'mean_population': self._population_sum / steps,
+            'final_population': self.get_population,
+            'mean_transitions': self._transitions_sum / steps,
+        }
+        for k, name in enumerate(self._classes):
+            summary[f'{name.lower()}_firings'] = (
+                self._firings[:, self._class_of == k].sum(axis=1))
+        return summary
+
+
+def main():
+    """Parse arguments and print aggregate statistics as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--villages', type=int, default=10000)
+    parser.add_argument('--duration', type=float, default=3600,
+                        help='simulated seconds')
+    parser.add_argument('--initial-workers', type=int, default=10)
+    parser.add_argument('--tau', type=float, default=BatchSimulation.tau,
+                        help='simulated seconds per step')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    BatchSimulation.tau = args.tau
+    start = time.perf_counter()
+    batch = BatchSimulation(args.villages, args.initial_workers, args.seed)
+    batch.run(args.duration)
+    elapsed = time.perf_counter() - start
+
+    summary = batch.summary()
+    print(json.dumps({
+        'villages': args.villages,
+        'duration': args.duration,
+        'wall_time': elapsed,
+        'village_hours_per_minute': (args.villages * args.duration / 3600
+                                     / elapsed * 60),
+        'extinct_fraction': float(summary['extinct'].mean()),
+        **{name: float(values.mean()) for name, values in summary.items()
+           if name != 'extinct'},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
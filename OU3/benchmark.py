@@ -0,0 +1,321 @@
+"""Module for benchmarking the throughput of the SimSims engine.
+
+Run as a script to benchmark synthetic villages of different sizes with a
+headless UI and shortened timings, for example:
+
+    python benchmark.py --sizes 10 100 1000 --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import adapt_policy
+import arc
+import place
+import runtime
+import simulation
+import token_simsims as token
+import transition
+from arc import drive
+from headless_ui import HeadlessUI
+
+TIMINGS = [
+    (arc.Arc, 'transport_time'),
+    (arc.Arc, 'retry_time'),
+    (transition.Transition, 'idle_time'),
+    (transition.Foodcourt, 'production_time'),
+    (transition.Apartment, 'rest_time'),
+    (transition.Farmland, 'production_time'),
+    (transition.Factory, 'base_production_time'),
+    (transition.Factory, 'production_time_multiplier'),
+    (simulation.Simulation, 'adapt_interval'),
+    (simulation.Simulation, 'adapt_debounce'),
+]
+
+# Statements timed by the import benchmark, the gui start loads everything
+# a headless start loaded before the gui modules were made lazy
+IMPORTS = {
+    'interpreter': 'pass',
+    'headless': 'import simulation',
+    'gui': 'import simulation, simsimsgui, async_runtime',
+}
+
+
+def scale_timings(factor):
+    """Multiply all simulation timings by factor. Return the old timings."""
+    saved = {}
+    for cls, name in TIMINGS:
+        saved[(cls, name)] = getattr(cls, name)
+        setattr(cls, name, getattr(cls, name) * factor)
+    return saved
+
+
+def restore_timings(saved):
+    """Restore timings returned by scale_timings."""
+    for (cls, name), value in saved.items():
+        setattr(cls, name, value)
+
+
+def percentiles(samples):
+    """Return latency statistics in microseconds for a list of seconds."""
+    samples = sorted(samples)
+    if len(samples) < 2:
+        samples = samples * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'count': len(samples),
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p50_us': cuts[49] * 1e6,
+        'p90_us': cuts[89] * 1e6,
+        'p99_us': cuts[98] * 1e6,
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def bench_import(repeats):
+    """Measure the startup time of fresh interpreters importing the engine.
+
+    Also report which of the heavy modules a headless start loads.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, statement in IMPORTS.items():
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', statement], cwd=directory,
+                           check=True)
+            times.append(time.perf_counter() - start)
+        results[f'{name}_s'] = statistics.median(times)
+    loaded = subprocess.run(
+        [sys.executable, '-c', 'import sys, simulation; print(*(name for name '
+         'in ("tkinter", "asyncio", "numpy") if name in sys.modules))'],
+        cwd=directory, check=True, capture_output=True, text=True)
+    results['headless_loads'] = loaded.stdout.split()
+    return results
+
+
+def build_village(num_transitions, gui=None, policy=None, runtime_=None):
+    """Create a simulation with num_transitions transitions, not started."""
+    sim = simulation.Simulation(os.devnull, num_transitions,
+                                gui or HeadlessUI(), policy=policy,
+                                runtime=runtime_)
+    types = transition.TRANSITION_TYPES
+    for i in range(num_transitions):
+        trans_type = types[i % len(types)]
+        sim.add_transition(trans_type(sim.get_gui, sim.get_arc))
+    for _ in range(num_transitions // 2):
+        sim.get_shed.add(token.Food(sim.get_gui))
+        sim.get_magazine.add(token.Product(sim.get_gui))
+    return sim
+
+
+def measure_memory(function, *args):
+    """Call function and return its result and peak traced memory in bytes."""
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def bench_place(operations):
+    """Measure latency of Place.add and Place.remove."""
+    gui = HeadlessUI()
+    shed = place.Shed(gui)
+    foods = [token.Food(gui) for _ in range(operations)]
+    add_times = []
+    remove_times = []
+    for food in foods:
+        start = time.perf_counter()
+        shed.add(food)
+        add_times.append(time.perf_counter() - start)
+    for _ in foods:
+        start = time.perf_counter()
+        shed.remove()
+        remove_times.append(time.perf_counter() - start)
+    return {'add': percentiles(add_times),
+            'remove': percentiles(remove_times)}
+
+
+def bench_arc(operations):
+    """Measure latency of a get and store round trip through the Arc."""
+    sim = build_village(0)
+    for _ in range(operations):
+        sim.get_shed.add(token.Food(sim.get_gui))
+    times = []
+    for _ in range(operations):
+        start = time.perf_counter()
+        drive(sim.get_arc.store_food(drive(sim.get_arc.get_food())))
+        times.append(time.perf_counter() - start)
+    return {'get_store': percentiles(times)}
+
+
+def bench_transition(firings):
+    """Measure latency of one full firing cycle for each transition type."""
+    sim = build_village(0)
+    # Places fill up without consumers, keep producers from blocking
+    sim.get_shed.set_capacity(None)
+    sim.get_magazine.set_capacity(None)
+    sim.get_road.add(token.Worker(sim.get_gui))
+    results = {}
+    for trans_type in transition.TRANSITION_TYPES:
+        trans = trans_type(sim.get_gui, sim.get_arc)
+        times = []
+        for _ in range(firings):
+            sim.get_shed.add(token.Food(sim.get_gui))
+            sim.get_magazine.add(token.Product(sim.get_gui))
+            if sim.get_road.get_amount == 0:
+                sim.get_road.add(token.Worker(sim.get_gui))
+            start = time.perf_counter()
+            if drive(trans._get_tokens()):
+                drive(trans._trigger())
+            drive(trans._release_tokens())
+            times.append(time.perf_counter() - start)
+        results[trans_type.__name__] = percentiles(times)
+    return results
+
+
+def bench_adapt(num_transitions, passes):
+    """Measure the cost of Simulation.adapt in a village of a given size."""
+    sim, build_peak = measure_memory(build_village, num_transitions)
+    times = []
+    for _ in range(passes):
+        start = time.perf_counter()
+        sim.adapt()
+        times.append(time.perf_counter() - start)
+    return {'transitions': num_transitions,
+            'build_peak_bytes': build_peak,
+            'adapt': percentiles(times)}
+
+
+def bench_throughput(num_transitions, duration, policy='threshold',
+                     runtime_='thread'):
+    """Run a village for duration seconds and measure its throughput.
+
+    Transition churn counts the transitions added and removed by adapt.
+    """
+    sim = build_village(num_transitions,
+                        policy=adapt_policy.POLICIES[policy](),
+                        runtime_=runtime.RUNTIMES[runtime_]())
+    added = sim.get_transitions_added
+    sim.start()
+    time.sleep(duration)
+    firings = sum(sim.get_firings(trans_type)
+                  for trans_type in transition.TRANSITION_TYPES)
+    moves = sim.get_arc.get_moves
+    final_transitions = len(sim.get_transitions())
+    adapt_passes = sim.get_adapt_passes
+    churn = (sim.get_transitions_added - added
+             + sim.get_transitions_removed)
+    sim.stop()
+    sim.join()
+    return {
+        'policy': policy,
+        'runtime': runtime_,
+        'transitions': num_transitions,
+        'final_transitions': final_transitions,
+        'duration_s': duration,
+        'firings': firings,
+        'firings_per_s': firings / duration,
+        'token_moves': moves,
+        'token_moves_per_s': moves / duration,
+        'adapt_passes': adapt_passes,
+        'transition_churn': churn,
+        'tokens_created': sim.get_token_pool.get_created,
+        'tokens_reused': sim.get_token_pool.get_reused,
+        'blocked_time': sim.get_arc.get_blocked_time,
+        'refused_tokens': sim.get_arc.get_refused,
+        'firings_per_s_by_type': {
+            trans_type.__name__: sim.get_firings(trans_type) / duration
+            for trans_type in transition.TRANSITION_TYPES
+        },
+    }
+
+
+def run_benchmarks(sizes, duration, time_scale, operations,
+                   policies=('threshold',), runtimes=('thread',)):
+    """Run all benchmarks and return the results as a dictionary."""
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time_scale': time_scale,
+    }
+    results['import'] = bench_import(10)
+    saved = scale_timings(0)
+    try:
+        results['place'], peak = measure_memory(bench_place, operations)
+        results['place']['peak_bytes'] = peak
+        results['arc'], peak = measure_memory(bench_arc, operations)
+        results['arc']['peak_bytes'] = peak
+        results['transition'] = bench_transition(operations // 10)
+        results['adapt'] = [bench_adapt(size, 20) for size in sizes]
+    finally:
+        restore_timings(saved)
+
+    saved = scale_timings(time_scale)
+    try:
+        results['throughput'] = [
+            bench_throughput(size, duration, policy, runtime_)
+            for runtime_ in runtimes
+            for policy in policies
+            for size in sizes
+        ]
+    finally:
+        restore_timings(saved)
+    return results
+
+
+def main():
+    """Parse arguments, run the benchmarks and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='number of transitions in each village')
+    parser.add_argument('--duration', type=float, default=5,
+                        help='seconds to run each throughput benchmark')
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='factor applied to all simulation timings')
+    parser.add_argument('--operations', type=int, default=10000,
+                        help='operations per micro benchmark')
+    parser.add_argument('--policies', nargs='+', default=['threshold'],
+                        choices=list(adapt_policy.POLICIES),
+                        help='adapt policies to run throughput benchmarks with')
+    parser.add_argument('--runtimes', nargs='+', default=['thread'],
+                        choices=list(runtime.RUNTIMES),
+                        help='transition runtimes to run throughput benchmarks with')
+    parser.add_argument('--capacity', type=int,
+                        help='capacity of the shed and the magazine')
+    parser.add_argument('--full-policy', default=arc.BLOCK,
+                        choices=[arc.BLOCK, arc.REFUSE],
+                        help='what storing in a full place does')
+    parser.add_argument('--output', help='file to write JSON results to')
+    args = parser.parse_args()
+    place.Shed.capacity = args.capacity
+    place.Magazine.capacity = args.capacity
+    arc.Arc.full_policy = args.full_policy
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            results = run_benchmarks(args.sizes, args.duration,
+                                     args.time_scale, args.operations,
+                                     args.policies, args.runtimes)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""Module for running ensembles of headless simulations in parallel.
+
+Run as a script to sweep a grid of parameters over several seeds, for example:
+
+    python ensemble.py --grid Foodcourt.poisoning_risk=0.01,0.05 \\
+        --grid Factory.death_rate=0.01,0.02 --seeds 10 --output runs.csv
+
+Every parameter set runs with the same seeds, so settings are compared on
+common random numbers. The table can be analysed with variance.py.
+"""
+import argparse
+import contextlib
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import arc
+import benchmark
+import place
+import simulation
+import token_simsims as token
+import transition
+from headless_ui import HeadlessUI
+
+PARAMETER_CLASSES = {
+    'Place': place.Place,
+    'Road': place.Road,
+    'Shed': place.Shed,
+    'Magazine': place.Magazine,
+    'Arc': arc.Arc,
+    'Transition': transition.Transition,
+    'Foodcourt': transition.Foodcourt,
+    'Apartment': transition.Apartment,
+    'Farmland': transition.Farmland,
+    'Factory': transition.Factory,
+    'Worker': token.Worker,
+    'Simulation': simulation.Simulation,
+}
+
+# Transitions whose random incidents have a known probability per firing
+CONTROL_TYPES = [trans_type for trans_type in transition.TRANSITION_TYPES
+                 if trans_type.incident_risk() is not None]
+CONTROL_FIELDS = [f'control_{trans_type.__name__.lower()}'
+                  for trans_type in CONTROL_TYPES]
+SUMMARY_FIELDS = (['run', 'seed', 'antithetic', 'survival_time', 'extinct',
+                   'mean_population', 'final_population', 'food_per_s',
+                   'products_per_s', 'meals_per_s', 'apartment_visits_per_s',
+                   'mean_transitions'] + CONTROL_FIELDS)
+
+
+def parameter_grid(grid):
+    """Return a list of parameter dicts, one per combination in grid.
+
+    grid maps a 'Class.attribute' name to a list of values.
+    """
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*grid.values())]
+
+
+def apply_parameters(parameters):
+    """Set class attributes named 'Class.attribute' to their values.
+
+    The attribute must be defined on the class itself. An inherited one is
+    mostly read from the class that defines it, so setting it on a
+    subclass would change nothing.
+    """
+    for name, value in parameters.items():
+        class_name, attribute = name.split('.')
+        cls = PARAMETER_CLASSES[class_name]
+        if not hasattr(cls, attribute):
+            raise ValueError(f'Unknown parameter {name}')
+        if attribute not in vars(cls):
+            owner = next(base for base in cls.__mro__
+                         if attribute in vars(base))
+            raise ValueError(f'{name} is inherited, set '
+                             f'{owner.__name__}.{attribute} instead')
+        setattr(cls, attribute, value)
+
+
+def count_population(sim):
+    """Return the number of workers on the road and in transitions."""
+    population = sim.get_road.get_amount
+    for trans in sim.get_transitions():
+        population += trans.count_tokens(token.Worker)
+    return population
+
+
+def run_headless(parameters, seed, duration, time_scale, initial_workers=10,
+                 sample_interval=1, antithetic=False):
+    """Run one headless simulation and return a summary dictionary.
+
+    duration and sample_interval are given in simulated seconds. With
+    antithetic the run draws from antithetic streams. The control fields
+    hold the incidents of a transition type minus the number expected
+    from its firings, their expectation is 0.
+    """
+    apply_parameters(parameters)
+    # Restored afterwards, a pool process runs many simulations and would
+    # otherwise scale the timings again for every run
+    saved = benchmark.scale_timings(time_scale)
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            with contextlib.redirect_stdout(devnull):
+                sim = simulation.Simulation(os.devnull, initial_workers,
+                                            HeadlessUI(), seed,
+                                            antithetic=antithetic)
+                sim.start()
+                populations = []
+                num_transitions = []
+                survival_time = duration
+                extinct = False
+                elapsed = 0
+                while elapsed < duration:
+                    time.sleep(sample_interval * time_scale)
+                    elapsed += sample_interval
+                    populations.append(count_population(sim))
+                    num_transitions.append(len(sim.get_transitions()))
+                    if populations[-1] == 0:
+                        survival_time = elapsed
+                        extinct = True
+                        break
+                firings = {trans_type: sim.get_firings(trans_type)
+                           for trans_type in transition.TRANSITION_TYPES}
+                controls = {field: (sim.get_incidents(trans_type)
+                                    - firings[trans_type]
+                                    * trans_type.incident_risk())
+                            for field, trans_type in zip(CONTROL_FIELDS,
+                                                         CONTROL_TYPES)}
+                sim.stop()
+                sim.join()
+    finally:
+        benchmark.restore_timings(saved)
+
+    summary = {
+        'seed': seed,
+        'antithetic': antithetic,
+        'survival_time': survival_time,
+        'extinct': extinct,
+        'mean_population': sum(populations) / len(populations),
+        'final_population': populations[-1],
+        'food_per_s': firings[transition.Farmland] / survival_time,
+        'products_per_s': firings[transition.Factory] / survival_time,
+        'meals_per_s': firings[transition.Foodcourt] / survival_time,
+        'apartment_visits_per_s': (firings[transition.Apartment]
+                                   / survival_time),
+        'mean_transitions': sum(num_transitions) / len(num_transitions),
+    }
+    summary.update(controls)
+    return summary
+
+
+def _run_one(run, parameters, seed, duration, time_scale, antithetic=False):
+    """Run one simulation in a worker process and tag it with its run id."""
+    summary = run_headless(parameters, seed, duration, time_scale,
+                           antithetic=antithetic)
+    summary['run'] = run
+    summary.update(parameters)
+    return summary
+
+
+def run_ensemble(grid, seeds, duration, time_scale, workers=None,
+                 antithetic=False):
+    """Run every parameter set in grid with every seed in a process pool.
+
+    With antithetic every seed is also run on antithetic streams. Yield
+    run summaries as they complete.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        runs = itertools.count()
+        for parameters in parameter_grid(grid):
+            for seed in seeds:
+                for mirrored in ((False, True) if antithetic else (False,)):
+                    futures.append(pool.submit(_run_one, next(runs),
+                                               parameters, seed, duration,
+                                               time_scale, mirrored))
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _parse_grid(values):
+    """Parse ['Class.attribute=1,2,3', ...] into a parameter grid."""
+    grid = {}
+    for value in values:
+        name, numbers = value.split('=')
+        grid[name] = [float(n) if '.' in n or 'e' in n else int(n)
+                      for n in numbers.split(',')]
+    return grid
+
+
+def main():
+    """Parse arguments and stream the ensemble results to a CSV table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--grid', action='append', default=[],
+                        help='Class.attribute=value1,value2,... to sweep')
+    parser.add_argument('--seeds', type=int, default=10,
+                        help='number of seeds per parameter set')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=300,
+                        help='simulated seconds per run')
+    parser.add_argument('--time-scale', type=float, default=0.1,
+                        help='factor applied to all simulation timings')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes, defaults to the CPU count')
+    parser.add_argument('--antithetic', action='store_true',
+                        help='also run every seed on antithetic streams')
+    parser.add_argument('--output', help='CSV file to write, default stdout')
+    args = parser.parse_args()
+
+    grid = _parse_grid(args.grid)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    fields = SUMMARY_FIELDS + list(grid)
+
+    with contextlib.ExitStack() as stack:
+        f = (stack.enter_context(open(args.output, 'w', newline='',
+                                      encoding='utf-8'))
+             if args.output else sys.stdout)
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for summary in run_ensemble(grid, seeds, args.duration,
+                                    args.time_scale, args.workers,
+                                    args.antithetic):
+            writer.writerow(summary)
+            f.flush()
+
+
+if __name__ == '__main__':
+    main()
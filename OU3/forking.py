@@ -0,0 +1,177 @@
+"""Module for forking a running simulation into what-if branches.
+
+A snapshot of the simulation is taken at the current moment and every
+branch continues from it in its own process, with its own parameters or
+adapt policy. Run as a script to warm up a headless simulation and fork
+it, for example:
+
+    python forking.py --warmup 60 --duration 120 --branch policy=threshold \\
+        --branch policy=rate --branch Factory.death_rate=0.05
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import adapt_policy
+import ensemble
+import sim_clock
+import simulation
+import transition
+from headless_ui import HeadlessUI
+
+
+def start_method():
+    """Return 'fork' where the OS supports it, otherwise 'spawn'."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return 'fork'
+    return 'spawn'
+
+
+def branch_state(data, branch):
+    """Return the snapshot a branch starts from.
+
+    A branch with a seed draws new random streams, other branches keep
+    the streams of the snapshot, so they see the same random numbers.
+    """
+    if branch.get('seed') is None:
+        return data
+    return dict(data, seed=branch['seed'], rng=None,
+                transitions=[{key: value for key, value in trans.items()
+                              if key != 'rng'}
+                             for trans in data['transitions']])
+
+
+def run_branch(data, branch, duration, time_scale=100, sample_interval=1):
+    """Continue a snapshot as one branch and return a summary dictionary.
+
+    branch is a dict with optional 'parameters', 'Class.attribute' names
+    mapped to values, a 'policy' name from adapt_policy.POLICIES and a
+    'seed'. duration and sample_interval are given in simulated seconds,
+    the branch runs time_scale times faster than real time.
+    """
+    ensemble.apply_parameters(branch.get('parameters', {}))
+    policy = branch.get('policy')
+    if policy is not None and policy not in adapt_policy.POLICIES:
+        raise ValueError(f'Unknown policy {policy}')
+    clock = sim_clock.SimClock(time_scale)
+    sim = simulation.Simulation.from_dict(
+        branch_state(data, branch), os.devnull, HeadlessUI(), clock=clock,
+        policy=adapt_policy.POLICIES[policy]() if policy else None)
+    firings_before = {trans_type: sim.get_firings(trans_type)
+                      for trans_type in transition.TRANSITION_TYPES}
+    sim.start()
+    populations = []
+    extinct = False
+    while clock.now() < duration:
+        time.sleep(sample_interval / time_scale)
+        populations.append(ensemble.count_population(sim))
+        if populations[-1] == 0:
+            extinct = True
+            break
+    elapsed = min(clock.now(), duration)
+    firings = {trans_type.__name__: (sim.get_firings(trans_type)
+                                     - firings_before[trans_type])
+               for trans_type in transition.TRANSITION_TYPES}
+    summary = {
+        'branch': branch.get('name'),
+        'elapsed': elapsed,
+        'extinct': extinct,
+        'mean_population': (sum(populations) / len(populations)
+                            if populations else ensemble.count_population(sim)),
+        'final_population': ensemble.count_population(sim),
+        'transitions': len(sim.get_transitions()),
+        'shed': sim.get_shed.get_amount,
+        'magazine': sim.get_magazine.get_amount,
+        'firings': firings,
+    }
+    sim.stop()
+    sim.join()
+    return summary
+
+
+def _run_branch(index, data, branch, duration, time_scale, results):
+    """Run a branch in a child process and put its summary on results."""
+    try:
+        results.put((index, run_branch(data, branch, duration, time_scale)))
+    except Exception as error:  # Reported to the parent instead of lost
+        results.put((index, {'branch': branch.get('name'),
+                             'error': repr(error)}))
+
+
+def fork_simulation(sim, branches, duration, time_scale=100, method=None):
+    """Fork a running simulation into one child process per branch.
+
+    Every branch continues from the same snapshot for duration simulated
+    seconds, while sim keeps running. Return the branch summaries in the
+    order of branches.
+    """
+    data = sim.snapshot()
+    context = multiprocessing.get_context(method or start_method())
+    results = context.Queue()
+    children = [context.Process(target=_run_branch,
+                                args=(index, data, branch, duration,
+                                      time_scale, results))
+                for index, branch in enumerate(branches)]
+    for child in children:
+        child.start()
+    summaries = [None] * len(children)
+    for _ in children:
+        index, summary = results.get()
+        summaries[index] = summary
+    for child in children:
+        child.join()
+    return summaries
+
+
+def parse_branch(text):
+    """Parse 'policy=rate,seed=1,Class.attribute=value,...' into a branch."""
+    branch = {'name': text, 'parameters': {}}
+    for item in filter(None, text.split(',')):
+        key, value = item.split('=')
+        if key == 'policy':
+            branch['policy'] = value
+        elif key == 'seed':
+            branch['seed'] = int(value)
+        else:
+            branch['parameters'][key] = (float(value) if '.' in value
+                                         or 'e' in value else int(value))
+    return branch
+
+
+def main():
+    """Parse arguments, warm up a simulation and fork it into branches."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--branch', action='append', default=[],
+                        help='policy=name,seed=n,Class.attribute=value,...')
+    parser.add_argument('--warmup', type=float, default=60,
+                        help='simulated seconds to run before forking')
+    parser.add_argument('--duration', type=float, default=120,
+                        help='simulated seconds every branch runs')
+    parser.add_argument('--time-scale', type=float, default=100,
+                        help='speed relative to real time')
+    parser.add_argument('--initial-workers', type=int, default=10)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--start-method', choices=('fork', 'spawn'))
+    args = parser.parse_args()
+
+    branches = [parse_branch(text) for text in args.branch or ['']]
+    clock = sim_clock.SimClock(args.time_scale)
+    sim = simulation.Simulation(os.devnull, args.initial_workers, HeadlessUI(),
+                                args.seed, clock=clock)
+    sim.start()
+    while clock.now() < args.warmup:
+        time.sleep(0.1)
+    start = time.perf_counter()
+    summaries = fork_simulation(sim, branches, args.duration, args.time_scale,
+                                args.start_method)
+    elapsed = time.perf_counter() - start
+    sim.stop()
+    sim.join()
+    print(json.dumps({'forked_at': args.warmup, 'seconds': round(elapsed, 2),
+                      'branches': summaries}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
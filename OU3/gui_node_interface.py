@@ -5,19 +5,19 @@ from threading import Lock
 class GUINodeInterface():
     """Abstract class for GUINodeComponent implementation."""
 
+    __slots__ = ('_gui', '_gui_component', '_lock')
+
+    # Callable taking the owner type name and returning a lock, used to
+    # swap in instrumented locks. None means a plain threading.Lock.
+    lock_factory = None
+
     def __init__(self, gui):
         """Initialize GUINodeInterface."""
         self._gui = gui
         self._gui_component = None
-        self._lock = Lock()
+        self._lock = self._create_lock()
         self._create_gui_component()
 
-    def __del__(self):
-        """Remove own gui_component."""
-        self._lock.acquire()
-        self._gui.remove(self._gui_component)
-        self._lock.release()
-
     @property
     def get_gui_component(self):
         """Return the GUINodeComponent."""
@@ -27,9 +27,22 @@ class GUINodeInterface():
         """Remove gui component from gui."""
         self._lock.acquire()
         if self._gui_component:
-            self._gui.remove(self.get_gui_component)
+            self._gui.remove(self._gui_component)
+            self._gui_component = None
         self._lock.release()
 
+    def _add_token_ui(self, token_):
+        """Show a token in own gui component, if the token has a gui component."""
+        token_ui = token_.get_gui_component
+        if token_ui:
+            self._gui_component.add_token(token_ui)
+
+    def _remove_token_ui(self, token_):
+        """Stop showing a token in own gui component."""
+        token_ui = token_.get_gui_component
+        if token_ui:
+            self._gui_component.remove_token(token_ui)
+
     def lock(self):
         """Acquire gui_component lock."""
         self._lock.acquire()
@@ -38,6 +51,12 @@ class GUINodeInterface():
         """Release gui_component lock."""
         self._lock.release()
 
+    def _create_lock(self):
+        """Create the gui_component lock, instrumented if a lock factory is set."""
+        if GUINodeInterface.lock_factory:
+            return GUINodeInterface.lock_factory(type(self).__name__)
+        return Lock()
+
     def _create_gui_component(self):
         """Abstract method to create gui component."""
         raise NotImplementedError
@@ -0,0 +1,23 @@
+"""Module for a user interface that draws nothing, for headless runs."""
+from simsimsui import SimSimsUI, UIComponent, UIDrawer, UINodeComponent
+
+
+class HeadlessUI(SimSimsUI):
+    """A UI that keeps track of nodes without drawing them or any tokens."""
+
+    renders_tokens = False
+
+    def _create_place_ui(self, properties):
+        return UINodeComponent(UIDrawer(properties))
+
+    def _create_transition_ui(self, properties):
+        return UINodeComponent(UIDrawer(properties))
+
+    def _create_token_ui(self, properties):
+        return UIComponent(UIDrawer(properties))
+
+    def update_ui(self):
+        """Overrides from SimSimsUI. Nothing to draw."""
+
+    def shoot(self):
+        """Overrides from SimSimsUI. Nothing to close."""
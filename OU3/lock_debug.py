@@ -0,0 +1,261 @@
+"""Module for detecting lock order problems and deadlocks in the simulation."""
+import sys
+import traceback
+from threading import Event, Lock, Thread, current_thread, enumerate as threads
+
+import simlog
+from gui_node_interface import GUINodeInterface
+
+_log = simlog.get_logger('lock_debug')
+
+
+def _format_stack(ident):
+    """Return the current stack of the thread with id ident as a string."""
+    frame = sys._current_frames().get(ident)
+    if frame is None:
+        return ''
+    return ''.join(traceback.format_stack(frame))
+
+
+def _thread_name(ident):
+    """Return the name of the thread with id ident."""
+    for thread in threads():
+        if thread.ident == ident:
+            return thread.name
+    return str(ident)
+
+
+class DebugLock():
+    """A threading.Lock replacement that reports to a LockOrderMonitor."""
+
+    def __init__(self, owner, monitor):
+        """Initialize debug lock."""
+        self._lock = Lock()
+        self._owner = owner
+        self._monitor = monitor
+
+    @property
+    def get_owner(self):
+        """Return the name of the owner type."""
+        return self._owner
+
+    def acquire(self, blocking=True, timeout=-1):
+        """Acquire the lock, updating the lock order and wait-for graphs."""
+        self._monitor.before_acquire(self)
+        if not self._lock.acquire(False):
+            if not blocking:
+                return False
+            self._monitor.start_waiting(self)
+            acquired = self._lock.acquire(True, timeout)
+            self._monitor.stop_waiting()
+            if not acquired:
+                return False
+        self._monitor.acquired(self)
+        return True
+
+    def release(self):
+        """Release the lock."""
+        self._monitor.released(self)
+        self._lock.release()
+
+    def locked(self):
+        """Return True if the lock is held."""
+        return self._lock.locked()
+
+    def __enter__(self):
+        """Acquire the lock in a with statement."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        """Release the lock at the end of a with statement."""
+        self.release()
+
+
+class LockOrderMonitor():
+    """Keeps a global lock order graph and a wait-for graph.
+
+    The lock order graph is kept per owner type, so an inversion is reported
+    the first time two types are locked in both orders, even if it never
+    deadlocks. The wait-for graph is kept per lock and reports actual
+    deadlocks together with the stacks of the threads involved.
+    """
+
+    def __init__(self, on_report=None):
+        """Initialize lock order monitor."""
+        self._lock = Lock()
+        self._order = {}
+        self._order_stacks = {}
+        self._holders = {}
+        self._held = {}
+        self._waiting = {}
+        self._reports = []
+        self._on_report = on_report or self._log_report
+
+    @property
+    def get_reports(self):
+        """Return a copy of all reports made so far."""
+        with self._lock:
+            return list(self._reports)
+
+    def create_lock(self, owner):
+        """Create and return a debug lock for an owner type name."""
+        return DebugLock(owner, self)
+
+    def enable(self):
+        """Make all new simulation objects use debug locks."""
+        GUINodeInterface.lock_factory = self.create_lock
+
+    def disable(self):
+        """Make new simulation objects use plain locks again."""
+        if GUINodeInterface.lock_factory == self.create_lock:
+            GUINodeInterface.lock_factory = None
+
+    def before_acquire(self, lock):
+        """Add lock order edges from every lock held by this thread to lock."""
+        ident = current_thread().ident
+        report = None
+        with self._lock:
+            for held in self._held.get(ident, []):
+                edge = (held.get_owner, lock.get_owner)
+                if held.get_owner == lock.get_owner or edge in self._order_stacks:
+                    continue
+                self._order.setdefault(edge[0], set()).add(edge[1])
+                self._order_stacks[edge] = _format_stack(ident)
+                path = self._find_path(lock.get_owner, held.get_owner)
+                if path and not report:
+                    cycle = [held.get_owner] + path
+                    report = {
+                        'type': 'lock order inversion',
+                        'cycle': cycle,
+                        'stacks': {
+                            ' -> '.join(pair): self._order_stacks[pair]
+                            for pair in zip(cycle, cycle[1:])
+                        },
+                    }
+        if report:
+            self._report(report)
+
+    def start_waiting(self, lock):
+        """Mark this thread as blocked on lock and look for a deadlock."""
+        ident = current_thread().ident
+        with self._lock:
+            self._waiting[ident] = lock
+            cycle = self._find_wait_cycle(ident)
+        if cycle:
+            self._report({
+                'type': 'deadlock',
+                'cycle': [f'{_thread_name(i)} waits for {l.get_owner}'
+                          for i, l in cycle],
+                'stacks': {_thread_name(i): _format_stack(i)
+                           for i, _ in cycle},
+            })
+
+    def stop_waiting(self):
+        """Mark this thread as no longer blocked."""
+        with self._lock:
+            self._waiting.pop(current_thread().ident, None)
+
+    def acquired(self, lock):
+        """Record that this thread holds lock."""
+        ident = current_thread().ident
+        with self._lock:
+            self._holders[lock] = ident
+            self._held.setdefault(ident, []).append(lock)
+
+    def released(self, lock):
+        """Record that lock is no longer held."""
+        with self._lock:
+            ident = self._holders.pop(lock, None)
+            held = self._held.get(ident, [])
+            if lock in held:
+                held.remove(lock)
+            if not held:
+                self._held.pop(ident, None)
+
+    def _find_path(self, start, goal):
+        """Return a path of owner types from start to goal in the order graph."""
+        stack = [(start, [start])]
+        visited = set()
+        while stack:
+            node, path = stack.pop()
+            if node == goal:
+                return path
+            if node in visited:
+                continue
+            visited.add(node)
+            for next_node in self._order.get(node, ()):
+                stack.append((next_node, path + [next_node]))
+        return None
+
+    def _find_wait_cycle(self, ident):
+        """Return [(thread, lock), ...] if ident is part of a wait-for cycle."""
+        cycle = []
+        thread = ident
+        while thread in self._waiting:
+            lock = self._waiting[thread]
+            cycle.append((thread, lock))
+            thread = self._holders.get(lock)
+            if thread == ident:
+                return cycle
+            if thread is None or thread in [i for i, _ in cycle]:
+                return None
+        return None
+
+    def _report(self, report):
+        """Store a report and pass it on to the report callback."""
+        with self._lock:
+            self._reports.append(report)
+        self._on_report(report)
+
+    @staticmethod
+    def _log_report(report):
+        """Log a report as a warning."""
+        _log.warning(report['type'].replace(' ', '_'), extra=simlog.fields(
+            cycle=' -> '.join(report['cycle']), stacks=report['stacks']))
+
+
+class Watchdog(Thread):
+    """Flags transitions of a simulation that have not progressed in a while."""
+
+    def __init__(self, sim, timeout, on_stall=None):
+        """Initialize watchdog for sim, flagging after timeout sim seconds."""
+        Thread.__init__(self, daemon=True)
+        self._sim = sim
+        self._timeout = timeout
+        self._on_stall = on_stall or self._log_stall
+        self._flagged = set()
+        self._timer = Event()
+
+    def run(self):
+        """Check the transitions of the simulation until stopped."""
+        while not self._timer.wait(self._timeout / 2):
+            self.check()
+
+    def check(self):
+        """Flag every transition whose last progress is older than timeout.
+
+        Progress is measured in simulated time, so a paused simulation is
+        never flagged.
+        """
+        now = self._sim.get_clock.now()
+        for trans in self._sim.get_transitions():
+            stalled_for = now - trans.get_last_progress
+            if stalled_for > self._timeout and not trans.is_stopping:
+                if trans not in self._flagged:
+                    self._flagged.add(trans)
+                    self._on_stall(trans, stalled_for,
+                                   _format_stack(trans.ident))
+            else:
+                self._flagged.discard(trans)
+
+    def stop(self):
+        """Stop the watchdog."""
+        self._timer.set()
+
+    @staticmethod
+    def _log_stall(trans, stalled_for, stack):
+        """Log a stalled transition as a warning."""
+        _log.warning('stalled', extra=simlog.fields(
+            transition=type(trans).__name__, thread=trans.name,
+            stalled_for=round(stalled_for, 1), stack=stack))
@@ -0,0 +1,165 @@
+"""Module for profiling lock contention in the simulation."""
+import json
+from threading import Lock
+from time import perf_counter
+
+from gui_node_interface import GUINodeInterface
+
+
+class LockStats():
+    """Accumulated acquisition statistics for one lock owner type."""
+
+    def __init__(self, owner):
+        """Initialize empty statistics for owner."""
+        self._owner = owner
+        self._lock = Lock()
+        self._locks = 0
+        self._acquisitions = 0
+        self._contended = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._hold_total = 0.0
+        self._hold_max = 0.0
+
+    @property
+    def get_owner(self):
+        """Return the name of the owner type."""
+        return self._owner
+
+    @property
+    def get_wait_total(self):
+        """Return the total time spent waiting for locks of this owner type."""
+        return self._wait_total
+
+    def add_lock(self):
+        """Count one more lock belonging to this owner type."""
+        with self._lock:
+            self._locks += 1
+
+    def record_acquire(self, wait, contended):
+        """Record one acquisition that waited wait seconds."""
+        with self._lock:
+            self._acquisitions += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            if contended:
+                self._contended += 1
+
+    def record_release(self, hold):
+        """Record that a lock was held for hold seconds."""
+        with self._lock:
+            self._hold_total += hold
+            self._hold_max = max(self._hold_max, hold)
+
+    def to_dict(self):
+        """Serialize the statistics to a dictionary."""
+        with self._lock:
+            acquisitions = max(self._acquisitions, 1)
+            return {
+                'owner': self._owner,
+                'locks': self._locks,
+                'acquisitions': self._acquisitions,
+                'contended': self._contended,
+                'contention_ratio': self._contended / acquisitions,
+                'wait_total': self._wait_total,
+                'wait_mean': self._wait_total / acquisitions,
+                'wait_max': self._wait_max,
+                'hold_total': self._hold_total,
+                'hold_mean': self._hold_total / acquisitions,
+                'hold_max': self._hold_max,
+            }
+
+
+class ProfiledLock():
+    """A threading.Lock replacement that reports to a LockStats object."""
+
+    def __init__(self, stats):
+        """Initialize profiled lock."""
+        self._lock = Lock()
+        self._stats = stats
+        self._acquired_at = 0.0
+        stats.add_lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        """Acquire the lock, recording wait time and contention."""
+        start = perf_counter()
+        if self._lock.acquire(False):
+            contended = False
+        elif blocking:
+            contended = True
+            if not self._lock.acquire(True, timeout):
+                return False
+        else:
+            return False
+        self._acquired_at = perf_counter()
+        self._stats.record_acquire(self._acquired_at - start, contended)
+        return True
+
+    def release(self):
+        """Release the lock, recording hold time."""
+        hold = perf_counter() - self._acquired_at
+        self._lock.release()
+        self._stats.record_release(hold)
+
+    def locked(self):
+        """Return True if the lock is held."""
+        return self._lock.locked()
+
+    def __enter__(self):
+        """Acquire the lock in a with statement."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        """Release the lock at the end of a with statement."""
+        self.release()
+
+
+class LockProfiler():
+    """Creates profiled locks and collects their statistics per owner type."""
+
+    def __init__(self):
+        """Initialize lock profiler."""
+        self._stats = {}
+        self._lock = Lock()
+
+    def create_lock(self, owner):
+        """Create and return a profiled lock for an owner type name."""
+        with self._lock:
+            if owner not in self._stats:
+                self._stats[owner] = LockStats(owner)
+            stats = self._stats[owner]
+        return ProfiledLock(stats)
+
+    def enable(self):
+        """Make all new simulation objects use profiled locks."""
+        GUINodeInterface.lock_factory = self.create_lock
+
+    def disable(self):
+        """Make new simulation objects use plain locks again."""
+        if GUINodeInterface.lock_factory == self.create_lock:
+            GUINodeInterface.lock_factory = None
+
+    def report(self):
+        """Return the statistics of all owner types, most waited on first."""
+        with self._lock:
+            stats = list(self._stats.values())
+        stats.sort(key=lambda s: s.get_wait_total, reverse=True)
+        return [s.to_dict() for s in stats]
+
+    def format_report(self):
+        """Return the report as a human readable table."""
+        lines = [f'{"owner":<12}{"locks":>8}{"acquired":>11}{"contended":>11}'
+                 f'{"wait tot":>11}{"wait max":>11}{"hold tot":>11}'
+                 f'{"hold max":>11}']
+        for row in self.report():
+            lines.append(f'{row["owner"]:<12}{row["locks"]:>8}'
+                         f'{row["acquisitions"]:>11}{row["contended"]:>11}'
+                         f'{row["wait_total"]:>11.4f}{row["wait_max"]:>11.4f}'
+                         f'{row["hold_total"]:>11.4f}{row["hold_max"]:>11.4f}')
+        return '\n'.join(lines)
+
+    def save(self, file):
+        """Write the report to file as JSON."""
+        with open(file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.report(), indent=2))
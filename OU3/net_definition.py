@@ -0,0 +1,264 @@
+"""Module for Petri net definitions loaded from JSON files.
+
+A definition declares places, transitions, arc weights, timings and the
+probabilities of alternative firing outcomes. It is a token count
+abstraction of the net: worker health is not modelled, its effects only
+enter through the outcome probabilities.
+
+A probability, a time or the transport time is a number or the name of
+a Transition or Arc class attribute, like "Factory.death_rate" or
+"Farmland.production_time". Named values are read whenever they are
+asked for, so a parameter sweep or scaled timings reach everything built
+on the definition. One outcome per transition may leave out its
+probability and gets the rest.
+"""
+import json
+import os
+from functools import lru_cache
+
+import arc
+import transition
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'simsims_net.json')
+
+
+def resolve(value, kind):
+    """Return a value given as a number or 'Class.attribute' name.
+
+    The class is Arc or a Transition class. kind names the value in the
+    error raised for an unknown name.
+    """
+    if not isinstance(value, str):
+        return value
+    class_name, _, attribute = value.partition('.')
+    cls = (arc.Arc if class_name == 'Arc'
+           else getattr(transition, class_name, None))
+    if (not isinstance(cls, type)
+            or not issubclass(cls, (arc.Arc, transition.Transition))
+            or not hasattr(cls, attribute)):
+        raise ValueError(f'Unknown {kind} {value}')
+    return getattr(cls, attribute)
+
+
+class NetTransition():
+    """One transition of a net definition."""
+
+    def __init__(self, name, class_name, time, pre, outcomes):
+        """Initialize net transition.
+
+        time is a number or a 'Class.attribute' name. pre maps place names
+        to arc weights. outcomes is a list of (probability, post) pairs
+        where post maps place names to weights. A probability is a number,
+        a 'Class.attribute' name or None for the rest.
+        """
+        self._name = name
+        self._class_name = class_name
+        self._time = time
+        self._pre = pre
+        self._outcomes = outcomes
+
+    @property
+    def get_name(self):
+        """Return the name of the transition."""
+        return self._name
+
+    @property
+    def get_class_name(self):
+        """Return the name of the Transition class this transition models."""
+        return self._class_name
+
+    @property
+    def get_time(self):
+        """Return the time a firing takes, without transport.
+
+        A named time is resolved to the current attribute value.
+        """
+        return resolve(self._time, 'time')
+
+    @property
+    def get_time_definition(self):
+        """Return the time as defined."""
+        return self._time
+
+    @property
+    def get_pre(self):
+        """Return the input arc weights per place name."""
+        return dict(self._pre)
+
+    @property
+    def get_outcomes(self):
+        """Return the list of (probability, post) outcomes.
+
+        Named probabilities are resolved to the current attribute values.
+        """
+        probabilities = [resolve(probability, 'probability')
+                         for probability, _ in self._outcomes]
+        rest = 1 - sum(probability for probability in probabilities
+                       if probability is not None)
+        return [(rest if probability is None else probability, dict(post))
+                for probability, (_, post) in zip(probabilities,
+                                                  self._outcomes)]
+
+    @property
+    def get_outcome_definitions(self):
+        """Return the outcomes with their probabilities as defined."""
+        return [(probability, dict(post))
+                for probability, post in self._outcomes]
+
+    def get_post_places(self):
+        """Return the names of all places any outcome puts tokens in."""
+        names = []
+        for _, post in self._outcomes:
+            names += [name for name in post if name not in names]
+        return names
+
+    def get_transports(self):
+        """Return the expected number of token moves per firing."""
+        moved_out = sum(probability * sum(post.values())
+                        for probability, post in self.get_outcomes)
+        return sum(self._pre.values()) + moved_out
+
+
+class NetDefinition():
+    """Places and transitions of a Petri net."""
+
+    def __init__(self, places, transitions, transport_time=0):
+        """Initialize net definition.
+
+        places maps place names to dicts with 'initial' token counts and an
+        optional 'arc_color'. transitions is a list of NetTransition.
+        """
+        self._places = places
+        self._transitions = transitions
+        self._transport_time = transport_time
+        self._validate()
+
+    @property
+    def get_place_names(self):
+        """Return the place names in definition order."""
+        return list(self._places)
+
+    @property
+    def get_transitions(self):
+        """Return the transitions in definition order."""
+        return list(self._transitions)
+
+    @property
+    def get_transport_time(self):
+        """Return the time it takes to move one token along an arc.
+
+        A named time is resolved to the current attribute value.
+        """
+        return resolve(self._transport_time, 'transport time')
+
+    def get_initial(self, place_name):
+        """Return the initial number of tokens in a place."""
+        return self._places[place_name].get('initial', 0)
+
+    def get_arc_color(self, place_name):
+        """Return the gui color of arcs to and from a place, or None."""
+        return self._places[place_name].get('arc_color')
+
+    def arc_properties(self, place_name):
+        """Return the gui properties of arcs to and from a place."""
+        properties = {'arrows': True}
+        if self.get_arc_color(place_name):
+            properties['color'] = self.get_arc_color(place_name)
+        return properties
+
+    def get_transition(self, name):
+        """Return the transition called name."""
+        for trans in self._transitions:
+            if trans.get_name == name:
+                return trans
+        raise ValueError(f'Unknown transition {name}')
+
+    def connections(self, class_name):
+        """Return the input and output place names of a Transition class."""
+        inputs, outputs = [], []
+        for trans in self._transitions:
+            if trans.get_class_name != class_name:
+                continue
+            inputs += [name for name in trans.get_pre if name not in inputs]
+            outputs += [name for name in trans.get_post_places()
+                        if name not in outputs]
+        return inputs, outputs
+
+    def _validate(self):
+        """Raise ValueError if the definition is inconsistent."""
+        if self.get_transport_time < 0:
+            raise ValueError('Negative transport time')
+        names = set()
+        for trans in self._transitions:
+            if trans.get_name in names:
+                raise ValueError(f'Duplicate transition {trans.get_name}')
+            names.add(trans.get_name)
+            if trans.get_time < 0:
+                raise ValueError(f'Negative time in {trans.get_name}')
+            arcs = [trans.get_pre] + [post for _, post in trans.get_outcomes]
+            for weights in arcs:
+                for place_name, weight in weights.items():
+                    if place_name not in self._places:
+                        raise ValueError(f'Unknown place {place_name} '
+                                         f'in {trans.get_name}')
+                    if weight < 0:
+                        raise ValueError(f'Negative arc weight in '
+                                         f'{trans.get_name}')
+            if [p for p, _ in trans.get_outcome_definitions].count(None) > 1:
+                raise ValueError(f'More than one outcome of {trans.get_name} '
+                                 'leaves out its probability')
+            probabilities = [p for p, _ in trans.get_outcomes]
+            if (not probabilities or min(probabilities) < 0
+                    or abs(sum(probabilities) - 1) > 1e-9):
+                raise ValueError(f'Outcome probabilities of {trans.get_name} '
+                                 'must sum to 1')
+
+    def to_dict(self):
+        """Serialize the definition to a dictionary."""
+        return {
+            'transport_time': self._transport_time,
+            'places': {name: dict(place) for name, place in self._places.items()},
+            'transitions': {
+                trans.get_name: {
+                    'class': trans.get_class_name,
+                    'time': trans.get_time_definition,
+                    'pre': trans.get_pre,
+                    'outcomes': [_outcome_to_dict(probability, post)
+                                 for probability, post
+                                 in trans.get_outcome_definitions],
+                } for trans in self._transitions
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a net definition from a dictionary."""
+        transitions = [
+            NetTransition(name, trans.get('class', name), trans.get('time', 0),
+                          trans.get('pre', {}),
+                          [(outcome.get('probability'),
+                            outcome.get('post', {}))
+                           for outcome in trans['outcomes']])
+            for name, trans in data['transitions'].items()
+        ]
+        return cls(data['places'], transitions, data.get('transport_time', 0))
+
+
+def _outcome_to_dict(probability, post):
+    """Return an outcome as in a definition file."""
+    if probability is None:
+        return {'post': post}
+    return {'probability': probability, 'post': post}
+
+
+def load_definition(path):
+    """Load a net definition from a JSON file."""
+    with open(path, encoding='utf-8') as f:
+        return NetDefinition.from_dict(json.load(f))
+
+
+@lru_cache(maxsize=None)
+def default_definition():
+    """Return the SimSims net definition shipped with the simulation."""
+    return load_definition(DEFAULT_PATH)
@@ -0,0 +1,190 @@
+"""Module for Petri nets compiled to incidence matrices.
+
+Markings are NumPy arrays with one token count per place. Every method
+also accepts a batch of markings with shape (..., places), so the
+enabledness and firing of all transitions in many markings are single
+vector operations.
+"""
+import numpy as np
+
+import net_definition
+
+
+class PetriNet():
+    """A net definition compiled to pre- and post-incidence matrices.
+
+    pre has shape (transitions, places). post has shape (transitions,
+    outcomes, places), one row per alternative outcome, padded with zero
+    probability outcomes so every transition has the same number.
+    """
+
+    def __init__(self, definition=None):
+        """Compile a NetDefinition, by default the SimSims net."""
+        self._definition = definition or net_definition.default_definition()
+        self._places = self._definition.get_place_names
+        transitions = self._definition.get_transitions
+        self._transitions = [trans.get_name for trans in transitions]
+
+        num_outcomes = max(len(trans.get_outcomes) for trans in transitions)
+        shape = (len(self._transitions), len(self._places))
+        self._pre = np.zeros(shape, dtype=np.int64)
+        self._post = np.zeros((shape[0], num_outcomes, shape[1]),
+                              dtype=np.int64)
+        self._probabilities = np.zeros((shape[0], num_outcomes))
+        self._times = np.zeros(shape[0])
+        self._transports = np.zeros(shape[0])
+
+        for t, trans in enumerate(transitions):
+            for place_name, weight in trans.get_pre.items():
+                self._pre[t, self.place_index(place_name)] = weight
+            for o, (probability, post) in enumerate(trans.get_outcomes):
+                self._probabilities[t, o] = probability
+                for place_name, weight in post.items():
+                    self._post[t, o, self.place_index(place_name)] = weight
+            self._times[t] = trans.get_time
+            self._transports[t] = trans.get_transports()
+
+        self._inputs = [np.flatnonzero(row) for row in self._pre]
+
+        for array in (self._pre, self._post, self._probabilities,
+                      self._times, self._transports):
+            array.setflags(write=False)
+
+    @property
+    def get_definition(self):
+        """Return the compiled net definition."""
+        return self._definition
+
+    @property
+    def get_places(self):
+        """Return the place names in matrix column order."""
+        return list(self._places)
+
+    @property
+    def get_transitions(self):
+        """Return the transition names in matrix row order."""
+        return list(self._transitions)
+
+    @property
+    def get_pre(self):
+        """Return the pre-incidence matrix."""
+        return self._pre
+
+    @property
+    def get_post(self):
+        """Return the post-incidence matrices, one per outcome."""
+        return self._post
+
+    @property
+    def get_probabilities(self):
+        """Return the outcome probabilities per transition."""
+        return self._probabilities
+
+    @property
+    def get_expected_incidence(self):
+        """Return the expected change of the marking per firing."""
+        return (np.einsum('to,top->tp', self._probabilities, self._post)
+                - self._pre)
+
+    @property
+    def get_cycle_times(self):
+        """Return the time of one firing per transition, transport included."""
+        return (self._times
+                + self._transports * self._definition.get_transport_time)
+
+    def place_index(self, place_name):
+        """Return the column of a place."""
+        try:
+            return self._places.index(place_name)
+        except ValueError:
+            raise ValueError(f'Unknown place {place_name}') from None
+
+    def transition_index(self, trans_name):
+        """Return the row of a transition."""
+        try:
+            return self._transitions.index(trans_name)
+        except ValueError:
+            raise ValueError(f'Unknown transition {trans_name}') from None
+
+    def initial_marking(self):
+        """Return the initial marking of the definition."""
+        return np.array([self._definition.get_initial(name)
+                         for name in self._places], dtype=np.int64)
+
+    def marking(self, **tokens):
+        """Return a marking with the given token count per place name."""
+        marking = np.zeros(len(self._places), dtype=np.int64)
+        for place_name, count in tokens.items():
+            marking[self.place_index(place_name)] = count
+        return marking
+
+    def enabled(self, marking):
+        """Return a boolean array of the transitions enabled in marking."""
+        marking = np.asarray(marking)
+        return np.all(marking[..., np.newaxis, :] >= self._pre, axis=-1)
+
+    def enabling_degree(self, marking, trans=None):
+        """Return how many times each transition could fire at once.
+
+        If trans is a transition row, return the degree of that transition
+        only, which only looks at its input places.
+        """
+        marking = np.asarray(marking)
+        if trans is not None:
+            inputs = self._inputs[trans]
+            return (marking[..., inputs] // self._pre[trans, inputs]).min(axis=-1)
+        degree = np.where(self._pre > 0,
+                          marking[..., np.newaxis, :] // np.maximum(self._pre, 1),
+                          np.iinfo(np.int64).max)
+        return degree.min(axis=-1)
+
+    def sample_outcomes(self, firings, rng):
+        """Split firing counts per transition into counts per outcome.
+
+        firings has shape (..., transitions), the result has shape
+        (..., transitions, outcomes).
+        """
+        firings = np.asarray(firings, dtype=np.int64)
+        num_outcomes = self._probabilities.shape[1]
+        outcomes = np.zeros(firings.shape + (num_outcomes,), dtype=np.int64)
+        remaining = firings.copy()
+        left = np.ones(len(self._transitions))
+        # A multinomial draw as a chain of conditional binomial draws
+        for o in range(num_outcomes - 1):
+            probability = np.clip(self._probabilities[:, o]
+                                  / np.maximum(left, 1e-12), 0, 1)
+            outcomes[..., o] = rng.binomial(remaining, probability)
+            remaining -= outcomes[..., o]
+            left -= self._probabilities[:, o]
+        outcomes[..., -1] = remaining
+        return outcomes
+
+    def fire(self, marking, firings, outcomes):
+        """Return the marking after firing transitions with given outcomes.
+
+        firings counts the firings per transition, outcomes counts the
+        firings per transition and outcome as given by sample_outcomes.
+        Raise ValueError if the marking does not hold enough tokens.
+        """
+        consumed = np.asarray(firings) @ self._pre
+        if np.any(consumed > marking):
+            raise ValueError('Transitions are not enabled often enough')
+        produced = np.einsum('...to,top->...p', outcomes, self._post)
+        return marking - consumed + produced
+
+    def step(self, marking, rng):
+        """Fire every transition enabled in marking once, in random order.
+
+        Transitions competing for the same tokens are resolved in a random
+        priority order. Return the new marking and the firings.
+        """
+        marking = np.array(marking, dtype=np.int64)
+        firings = np.zeros(marking.shape[:-1] + (len(self._transitions),),
+                           dtype=np.int64)
+        available = marking.copy()
+        for t in rng.permutation(len(self._transitions)):
+            can_fire = np.all(available >= self._pre[t], axis=-1)
+            firings[..., t] = can_fire
+            available -= can_fire[..., np.newaxis] * self._pre[t]
+        outcomes = self.sample_outcomes(firings, rng)
+        return self.fire(marking, firings, outcomes), firings
@@ -1,55 +1,168 @@
 """Module for places that store tokens."""
+import logging
+
+import simlog
+import token_pool
 import token_simsims as token
+import worker_index
 from gui_node_interface import GUINodeInterface
 
+_log = simlog.get_logger('place')
+
 
 class Place(GUINodeInterface):
     """Parent class for all places."""
 
     threshold_min = 3
     threshold_max = 20
+    # Maximum number of tokens, None for no limit
+    capacity = None
+    # Properties of the place's gui component
+    gui_properties = {}
 
     def __init__(self, gui):
         """Initialize place."""
         GUINodeInterface.__init__(self, gui)
         self._tokens = []
+        self._listeners = []
+        self._threshold_state = 0
+        self._capacity = type(self).capacity
 
     @property
     def get_amount(self):
         """Return the number of tokens in the container."""
         return len(self._tokens)
 
-    def add(self, token):
-        """Add a token to the container."""
+    @property
+    def get_capacity(self):
+        """Return the maximum number of tokens, None if there is no limit."""
+        return self._capacity
+
+    def set_capacity(self, capacity):
+        """Set the maximum number of tokens, None for no limit."""
+        if capacity is not None and capacity < 0:
+            raise ValueError(f'Negative capacity {capacity}')
+        self._capacity = capacity
+
+    @property
+    def is_full(self):
+        """Return True if the place has a capacity and is at it."""
+        return (self._capacity is not None
+                and self.get_amount >= self._capacity)
+
+    @property
+    def get_threshold_state(self):
+        """Return -1 if below threshold_min, 1 if above threshold_max, else 0."""
+        return self._threshold_state
+
+    def subscribe(self, callback):
+        """Call callback(place, state) whenever the threshold state changes."""
+        self._threshold_state = self._compute_threshold_state()
+        self._listeners.append(callback)
+
+    def _compute_threshold_state(self):
+        """Return the threshold state for the current amount."""
+        if self.get_amount < Place.threshold_min:
+            return -1
+        if self.get_amount > Place.threshold_max:
+            return 1
+        return 0
+
+    def _update_threshold_state(self):
+        """Update the threshold state. Return True if it changed.
+
+        Must be called with the place locked.
+        """
+        state = self._compute_threshold_state()
+        changed = state != self._threshold_state
+        self._threshold_state = state
+        return changed
+
+    def _publish_threshold_state(self):
+        """Notify all listeners of the current threshold state."""
+        for callback in self._listeners:
+            callback(self, self._threshold_state)
+
+    def add(self, token, on_added=None):
+        """Add a token to the container, regardless of its capacity.
+
+        on_added is called with the place locked once the token is added.
+        """
+        self._insert(token, False, on_added)
+
+    def try_add(self, token, on_added=None):
+        """Add a token unless the place is full. Return True if it was added.
+
+        on_added is called with the place locked once the token is added.
+        """
+        return self._insert(token, True, on_added)
+
+    def _insert(self, token, bounded, on_added=None):
+        """Add a token, if bounded only when the place is not full.
+
+        Return True if the token was added.
+        """
         token.lock()
         self.lock()
-        self._tokens.append(token)
-        self._gui_component.add_token(token.get_gui_component)
+        if bounded and self.is_full:
+            self.release()
+            token.release()
+            return False
+        self._push(token)
+        self._add_token_ui(token)
+        if on_added:
+            on_added()
+        crossed = self._update_threshold_state()
         self.release()
         token.release()
+        if crossed:
+            self._publish_threshold_state()
+        return True
 
-    def remove(self):
+    def remove(self, priority=None):
         """
         Remove and return the first token in the container.
 
-        Raise RuntimeError if the container is empty.
+        priority is passed on to _pop and lets subclasses hand out another
+        token than the first. Raise RuntimeError if the container is empty.
         """
         self.lock()
         if len(self._tokens) > 0:
-            token = self._tokens.pop(0)
+            token = self._pop(priority)
             token.lock()
-            self._gui_component.remove_token(token.get_gui_component)
+            self._remove_token_ui(token)
+            crossed = self._update_threshold_state()
             self.release()
             token.release()
+            if crossed:
+                self._publish_threshold_state()
             return token
         else:
             self.release()
             raise RuntimeError(f'Not enough resources in {type(self).__name__}') 
 
+    def _push(self, token):
+        """Store a token. Must be called with the place locked."""
+        self._tokens.append(token)
+
+    def _pop(self, priority):
+        """Remove and return the first token. Must be called with the place locked."""
+        return self._tokens.pop(0)
+
+    def _create_gui_component(self):
+        """Create a gui component from gui_properties and add it to gui."""
+        self.lock()
+        self._gui_component = self._gui.create_place_ui(
+            type(self).gui_properties)
+        self.release()
+
     def need_to_adapt(self):
         """Return True if changes are needed to balance resources."""
         adapt = not Place.threshold_min <= self.get_amount <= Place.threshold_max
-        print(f'{type(self).__name__} needs to adapt: {adapt}')
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug('need_to_adapt', extra=simlog.fields(
+                place=type(self).__name__, amount=self.get_amount,
+                adapt=adapt))
         return adapt
 
     def to_dict(self):
@@ -65,17 +178,12 @@ class Place(GUINodeInterface):
 class Shed(Place):
     """A place to store food tokens."""
 
+    gui_properties = {'lable': 'Shed', 'color': '#00ff00'}
+
     def __init__(self, gui):
         """Initialize Shed."""
         super().__init__(gui)
 
-    def _create_gui_component(self):
-        """Create a green shed gui components and adds it to gui."""
-        properties = {'lable': 'Shed', 'color': '#00ff00'}
-        self.lock()
-        self._gui_component = self._gui.create_place_ui(properties)
-        self.release()
-
     def to_dict(self):
         """Serialize shed to a dictionary."""
         return {'food': self.get_amount}
@@ -92,17 +200,12 @@ class Shed(Place):
 class Magazine(Place):
     """A place to store product tokens."""
 
+    gui_properties = {'lable': 'Magazine', 'color': '#6666ff'}
+
     def __init__(self, gui):
         """Initialize Magazine."""
         super().__init__(gui)
 
-    def _create_gui_component(self):
-        """Create a red magazine gui component and add it to gui."""
-        properties = {'lable': 'Magazine', 'color': '#6666ff'}
-        self.lock()
-        self._gui_component = self._gui.create_place_ui(properties)
-        self.release()
-
     def to_dict(self):
         """Serialize magazine to a dictionary."""
         return {'product': self.get_amount}
@@ -117,31 +220,50 @@ class Magazine(Place):
 
 
 class Road(Place):
-    """A place to store workers."""
+    """A place to store workers.
+
+    Workers are indexed by health, so remove can hand out the oldest,
+    healthiest or weakest worker in O(log n).
+    """
 
-    def __init__(self, initial_workers, gui):
-        """Initialize Road."""
+    gui_properties = {'lable': 'Road', 'color': '#000000'}
+
+    def __init__(self, initial_workers, gui, pool=None):
+        """Initialize Road.
+
+        Workers that die on the road are released to pool.
+        """
         super().__init__(gui)
+        self._tokens = worker_index.WorkerIndex()
+        self._pool = pool or token_pool.TokenPool(gui)
         for _ in range(initial_workers):
-            self.add(token.Worker(gui))
+            self.add(self._pool.acquire(token.Worker))
 
-    def add(self, worker):
+    def _insert(self, worker, bounded, on_added=None):
         """Add a worker to the road.
 
         Reduce its health proportional to the amount
-        of workers already on the road.
+        of workers already on the road. A worker that dies
+        counts as added.
         """
+        if bounded and self.is_full:
+            return False
         # Removes 1% of max health for each worker on the road
         life_to_remove = token.Worker.max_health * 0.01 * self.get_amount
         if not worker.decrease_health(life_to_remove):
-            super().add(worker)
+            return super()._insert(worker, bounded, on_added)
+        if on_added:
+            on_added()
+        self._pool.release(worker)
+        return True
 
-    def _create_gui_component(self):
-        """Create a black road gui component and add it to gui."""
-        properties = {'lable': 'Road', 'color': '#000000'}
-        self.lock()
-        self._gui_component = self._gui.create_place_ui(properties)
-        self.release()
+    def _push(self, worker):
+        """Index a worker. Must be called with the road locked."""
+        self._tokens.push(worker)
+
+    def _pop(self, priority):
+        """Remove and return a worker by priority, oldest if None."""
+        return self._tokens.pop(priority or worker_index.OLDEST)
 
     def to_dict(self):
         """Serialize road to a dictionary."""
@@ -149,15 +271,15 @@ class Road(Place):
                             in self._tokens if worker.get_health > 0]}
 
     @classmethod
-    def from_dict(cls, data, gui):
-        """Create and return a magazine from a dict object."""
-        road = cls(0, gui)
+    def from_dict(cls, data, gui, pool=None):
+        """Create and return a road from a dict object."""
+        road = cls(0, gui, pool)
         for worker in data['workers']:
             worker = token.Worker.from_dict(worker, gui)
             worker.lock()
             road.lock()
-            road._tokens.append(worker)
-            road.get_gui_component.add_token(worker.get_gui_component)
+            road._push(worker)
+            road._add_token_ui(worker)
             road.release()
             worker.release()
 
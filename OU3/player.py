@@ -0,0 +1,252 @@
+"""Module for replaying a recorded simulation run in a user interface.
+
+Usage: python player.py run.jsonl [--speed 10] [--start 30] [--end 60]
+"""
+import argparse
+import json
+import time
+from bisect import bisect_right
+
+import net_definition
+import place
+import recorder
+import simsimsui
+import transition
+
+PLACE_TYPES = {'road': place.Road, 'shed': place.Shed,
+               'magazine': place.Magazine}
+TRANSITION_TYPES = {trans_type.__name__: trans_type
+                    for trans_type in transition.TRANSITION_TYPES}
+# The token type each place holds
+PLACE_TOKENS = {'road': 0, 'shed': 1, 'magazine': 2}
+
+
+def load_events(path):
+    """Return the events of a recorded run as a list of dicts."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayState():
+    """The places and transitions of a recorded run at some time."""
+
+    def __init__(self):
+        """Initialize an empty state."""
+        self.places = {name: 0 for name in recorder.PLACES}
+        # Transition id -> {'type', 'tokens', 'mode'}
+        self.transitions = {}
+
+    def apply(self, event):
+        """Update the state with an event."""
+        kind = event['e']
+        if kind == recorder.PLACE:
+            self.places[event['p']] = event['n']
+        elif kind == recorder.HOLD:
+            if event['id'] in self.transitions:
+                self.transitions[event['id']]['tokens'] = event['n']
+        elif kind == recorder.ADD:
+            self.transitions[event['id']] = {'type': event['type'],
+                                             'tokens': [0, 0, 0],
+                                             'mode': event['mode']}
+        elif kind == recorder.REMOVE:
+            self.transitions.pop(event['id'], None)
+        elif kind == recorder.MODE:
+            if event['id'] in self.transitions:
+                self.transitions[event['id']]['mode'] = event['mode']
+        elif kind in (recorder.KEYFRAME, recorder.STOP):
+            self.places = dict(event['places'])
+            self.transitions = {
+                id_: {'type': type_, 'tokens': list(tokens), 'mode': mode}
+                for id_, type_, tokens, mode in event['transitions']}
+
+
+class Player():
+    """Replays a recorded run into a SimSimsUI.
+
+    The state at any time is found by applying the events after the last
+    keyframe before it, so seeking costs at most one keyframe interval of
+    events. Only the difference to what is shown is drawn.
+    """
+
+    # Real seconds between drawn frames while playing
+    frame_interval = 0.05
+
+    def __init__(self, events, gui=None, net=None):
+        """Initialize player.
+
+        If no gui is given a SimSimsGUI window is created. net is the
+        NetDefinition used to draw arcs, by default the SimSims net.
+        """
+        self._events = events
+        self._keyframes = [idx for idx, event in enumerate(events)
+                           if event['e'] in (recorder.KEYFRAME, recorder.STOP)]
+        self._keyframe_times = [events[idx]['t'] for idx in self._keyframes]
+        self._gui = gui or simsimsui.SimSimsGUI(w=700, h=700)
+        self._gui.on_shoot(self.stop)
+        self._net = net or net_definition.default_definition()
+        self._state = ReplayState()
+        self._position = 0
+        self._time = 0
+        self._stopped = False
+
+        self._place_uis = {name: self._gui.create_place_ui(
+            PLACE_TYPES[name].gui_properties) for name in recorder.PLACES}
+        self._transition_uis = {}
+        # Node ui -> list of shown token uis per token type
+        self._token_uis = {}
+        self._autoplace()
+
+    @classmethod
+    def from_file(cls, path, gui=None, net=None):
+        """Create a player for the run recorded in path."""
+        return cls(load_events(path), gui, net)
+
+    @property
+    def get_time(self):
+        """Return the simulated time shown."""
+        return self._time
+
+    @property
+    def get_end_time(self):
+        """Return the simulated time of the last event."""
+        return self._events[-1]['t'] if self._events else 0
+
+    @property
+    def is_stopped(self):
+        """Return True if playing was stopped or the gui was closed."""
+        return self._stopped
+
+    @property
+    def get_gui(self):
+        """Return the gui."""
+        return self._gui
+
+    @property
+    def get_state(self):
+        """Return the ReplayState at the shown time."""
+        return self._state
+
+    def stop(self):
+        """Stop playing."""
+        self._stopped = True
+
+    def seek(self, time_):
+        """Show the state at simulated time time_."""
+        key = bisect_right(self._keyframe_times, time_) - 1
+        if key >= 0 and (self._keyframes[key] >= self._position
+                         or time_ < self._time):
+            self._state = ReplayState()
+            self._position = self._keyframes[key]
+        elif time_ < self._time:
+            self._state = ReplayState()
+            self._position = 0
+        self._advance(time_)
+        self._render()
+
+    def play(self, speed=1, start=None, end=None):
+        """Replay from start to end at speed times the recorded speed.
+
+        start defaults to the shown time and end to the last event.
+        """
+        self._stopped = False
+        self.seek(self._time if start is None else start)
+        end = self.get_end_time if end is None else end
+        real_start = time.monotonic()
+        sim_start = self._time
+        while not self._stopped and self._time < end:
+            time.sleep(Player.frame_interval)
+            self._advance(min(end, sim_start
+                              + (time.monotonic() - real_start) * speed))
+            self._render()
+            self._gui.update_ui()
+
+    def _advance(self, time_):
+        """Apply the events up to time_ to the state."""
+        while (self._position < len(self._events)
+               and self._events[self._position]['t'] <= time_):
+            self._state.apply(self._events[self._position])
+            self._position += 1
+        self._time = time_
+
+    def _render(self):
+        """Update the gui to show the state."""
+        transitions = self._state.transitions
+        changed = False
+        for id_ in [id_ for id_ in self._transition_uis
+                    if id_ not in transitions]:
+            ui = self._transition_uis.pop(id_)
+            self._token_uis.pop(ui, None)
+            self._gui.remove(ui)
+            changed = True
+        for id_, trans in transitions.items():
+            if id_ not in self._transition_uis:
+                self._transition_uis[id_] = self._create_transition_ui(
+                    trans['type'])
+                changed = True
+        if changed:
+            self._autoplace()
+
+        for name, ui in self._place_uis.items():
+            counts = [0, 0, 0]
+            counts[PLACE_TOKENS[name]] = self._state.places[name]
+            self._show_tokens(ui, counts)
+        for id_, ui in self._transition_uis.items():
+            self._show_tokens(ui, transitions[id_]['tokens'])
+
+    def _create_transition_ui(self, type_name):
+        """Create a transition ui connected like the transition type in the net."""
+        ui = self._gui.create_transition_ui(
+            TRANSITION_TYPES[type_name].gui_properties)
+        inputs, outputs = self._net.connections(type_name)
+        for place_name in inputs:
+            self._gui.connect(self._place_uis[place_name], ui,
+                              self._net.arc_properties(place_name))
+        for place_name in outputs:
+            self._gui.connect(ui, self._place_uis[place_name],
+                              self._net.arc_properties(place_name))
+        return ui
+
+    def _autoplace(self):
+        """Place all nodes like Simulation.update_gui_positions."""
+        uis = list(self._place_uis.values()) + list(self._transition_uis.values())
+        for idx, ui in enumerate(uis):
+            ui.autoplace(idx, len(uis))
+
+    def _show_tokens(self, ui, counts):
+        """Add or remove token uis until ui shows counts tokens of each type."""
+        if not self._gui.renders_tokens:
+            return
+        shown = self._token_uis.setdefault(ui, [[] for _ in counts])
+        for type_, (tokens, target) in enumerate(zip(shown, counts)):
+            while len(tokens) < target:
+                tokens.append(self._gui.create_token_ui(
+                    {'color': recorder.TOKEN_TYPES[type_].color}))
+                ui.add_token(tokens[-1])
+            while len(tokens) > target:
+                ui.remove_token(tokens[-1])
+                tokens.pop().shoot()
+
+
+def main():
+    """Parse arguments and replay a recorded run."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', help='event log written by a Recorder')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='replay speed relative to the recorded run')
+    parser.add_argument('--start', type=float, default=0,
+                        help='simulated time to start at')
+    parser.add_argument('--end', type=float,
+                        help='simulated time to stop at')
+    args = parser.parse_args()
+
+    player = Player.from_file(args.log)
+    player.play(args.speed, args.start, args.end)
+    # Keep showing the last frame until the window is closed
+    while not player.is_stopped:
+        player.get_gui.update_ui()
+        time.sleep(Player.frame_interval)
+    player.get_gui.shoot()
+
+
+if __name__ == '__main__':
+    main()
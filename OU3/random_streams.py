@@ -0,0 +1,49 @@
+"""Module for independent, reproducible random streams."""
+import random
+
+
+def derive_stream(master):
+    """Return a new random stream seeded from the master stream."""
+    return random.Random(master.getrandbits(64))
+
+
+def state_to_list(rng):
+    """Return the state of a random stream as a JSON serializable list."""
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def set_state(rng, state):
+    """Restore the state of a random stream from state_to_list output."""
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
+
+
+class AntitheticRandom(random.Random):
+    """A random stream that draws 1 - u for every u of a Random with its state.
+
+    Integers below n are mirrored to n - 1 - r. Both streams consume the
+    same bits for every draw, so they stay in step, and a run on the
+    antithetic stream makes the opposite choice wherever the run on the
+    plain stream was on one side of a threshold. Averaging both runs
+    cancels much of the noise of either.
+    """
+
+    def random(self):
+        """Return the mirrored next uniform from [0, 1)."""
+        # 1.0 - u lies in (0, 1], so the rare u == 0.0 is mirrored to the
+        # largest float below 1.0
+        return min(1.0 - super().random(), 1.0 - 2**-53)
+
+    def _randbelow(self, n):
+        """Return the mirrored next int from [0, n)."""
+        return n - 1 - super()._randbelow(n)
+
+
+def antithetic(rng):
+    """Return an antithetic stream continuing from the state of rng."""
+    if isinstance(rng, AntitheticRandom):
+        return rng
+    stream = AntitheticRandom()
+    stream.setstate(rng.getstate())
+    return stream
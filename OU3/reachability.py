@@ -0,0 +1,291 @@
+"""Module for reachability and coverability analysis of nets.
+
+The state of a village is the marking of its places plus what every
+transition instance is doing: idle, or busy firing one net transition
+after having taken its input tokens. Instances of the same Transition
+class are interchangeable, so with symmetry reduction only the sorted
+instance states are stored. Places that can grow without bound are
+marked OMEGA by Karp-Miller acceleration, which keeps the search finite.
+Run as a script, for example:
+
+    python reachability.py --road 10 --instances Apartment=1 Factory=1
+"""
+import argparse
+import json
+import math
+from collections import deque
+
+import adapt_policy
+import net_definition
+
+OMEGA = math.inf
+IDLE = -1
+
+
+class Report():
+    """Result of exploring the states of a net."""
+
+    def __init__(self, places, transitions, states, edges, dead, bounds,
+                 truncated, parents):
+        """Initialize report."""
+        self._places = places
+        self._transitions = transitions
+        self._states = states
+        self._edges = edges
+        self._dead = dead
+        self._bounds = bounds
+        self._truncated = truncated
+        self._parents = parents
+
+    @property
+    def get_num_states(self):
+        """Return the number of distinct states found."""
+        return len(self._states)
+
+    @property
+    def get_num_edges(self):
+        """Return the number of state transitions found."""
+        return self._edges
+
+    @property
+    def get_bounds(self):
+        """Return the highest token count found per place, OMEGA if unbounded."""
+        return dict(zip(self._places, self._bounds))
+
+    @property
+    def is_bounded(self):
+        """Return True if every place is bounded."""
+        return OMEGA not in self._bounds
+
+    @property
+    def is_truncated(self):
+        """Return True if the search stopped at max_states."""
+        return self._truncated
+
+    @property
+    def get_dead_markings(self):
+        """Return the markings in which no transition can start or finish."""
+        return [self._format_marking(self._states[i]) for i in self._dead]
+
+    @property
+    def can_deadlock(self):
+        """Return True if a dead marking is reachable."""
+        return bool(self._dead)
+
+    def get_trace(self, dead_index=0):
+        """Return the firing sequence leading to a dead marking."""
+        trace = []
+        state = self._dead[dead_index]
+        while self._parents[state] is not None:
+            state, label = self._parents[state]
+            trace.append(label)
+        return trace[::-1]
+
+    def _format_marking(self, state):
+        """Return a state as a dictionary of place counts."""
+        marking, _ = state
+        return {name: (count if count != OMEGA else 'omega')
+                for name, count in zip(self._places, marking)}
+
+    def to_dict(self):
+        """Serialize the report to a dictionary."""
+        return {
+            'states': self.get_num_states,
+            'edges': self._edges,
+            'truncated': self._truncated,
+            'bounded': self.is_bounded,
+            'bounds': {name: (bound if bound != OMEGA else 'omega')
+                       for name, bound in self.get_bounds.items()},
+            'dead_markings': self.get_dead_markings,
+            'trace_to_dead': self.get_trace() if self._dead else None,
+        }
+
+
+class Explorer():
+    """Explores the reachable and coverable states of a net definition."""
+
+    max_states = 100000
+
+    def __init__(self, definition=None, instances=None, symmetry=True):
+        """Initialize explorer.
+
+        instances maps Transition class names to the number of instances,
+        by default AdaptPolicy.min_transitions of every class. If symmetry
+        is False every instance is tracked on its own.
+        """
+        self._definition = definition or net_definition.default_definition()
+        self._places = self._definition.get_place_names
+        transitions = self._definition.get_transitions
+        self._transitions = [trans.get_name for trans in transitions]
+        self._classes = list(dict.fromkeys(trans.get_class_name
+                                           for trans in transitions))
+        instances = instances or {}
+        for name in instances:
+            if name not in self._classes:
+                raise ValueError(f'Unknown transition class {name}')
+        self._instances = [instances.get(name,
+                                         adapt_policy.AdaptPolicy.min_transitions)
+                           for name in self._classes]
+        self._symmetry = symmetry
+
+        self._class_of = [self._classes.index(trans.get_class_name)
+                          for trans in transitions]
+        self._pre = [self._vector(trans.get_pre) for trans in transitions]
+        self._outcomes = [[self._vector(post)
+                           for probability, post in trans.get_outcomes
+                           if probability > 0]
+                          for trans in transitions]
+
+    def _vector(self, weights):
+        """Return place weights as a tuple in place order."""
+        return tuple(weights.get(name, 0) for name in self._places)
+
+    def initial_state(self, marking=None):
+        """Return the state with all instances idle.
+
+        marking maps place names to token counts, by default the initial
+        marking of the definition.
+        """
+        if marking is None:
+            marking = {name: self._definition.get_initial(name)
+                       for name in self._places}
+        busy = tuple((IDLE,) * count for count in self._instances)
+        return (self._vector(marking), busy)
+
+    def _canonical(self, busy):
+        """Return instance states with interchangeable instances sorted."""
+        if not self._symmetry:
+            return busy
+        return tuple(tuple(sorted(states)) for states in busy)
+
+    def successors(self, state):
+        """Return (label, state) for every state reachable in one step."""
+        marking, busy = state
+        result = []
+        for t, name in enumerate(self._transitions):
+            states = busy[self._class_of[t]]
+            # Start: an idle instance takes the input tokens
+            if IDLE in states and all(m >= w for m, w
+                                      in zip(marking, self._pre[t])):
+                instances = self._update(busy, t, IDLE, t)
+                for instance, new_busy in instances:
+                    result.append((f'start {name}{instance}', (
+                        tuple(m - w for m, w in zip(marking, self._pre[t])),
+                        new_busy)))
+            # Finish: a busy instance puts the tokens of an outcome
+            if t in states:
+                instances = self._update(busy, t, t, IDLE)
+                for instance, new_busy in instances:
+                    for o, post in enumerate(self._outcomes[t]):
+                        result.append((f'finish {name}{instance}/{o}', (
+                            tuple(m + w for m, w in zip(marking, post)),
+                            new_busy)))
+        return result
+
+    def _update(self, busy, t, old, new):
+        """Return (label, busy) for every instance in state old set to new.
+
+        With symmetry reduction only one instance is tried.
+        """
+        k = self._class_of[t]
+        states = busy[k]
+        result = []
+        for i, value in enumerate(states):
+            if value != old:
+                continue
+            new_states = states[:i] + (new,) + states[i + 1:]
+            new_busy = self._canonical(busy[:k] + (new_states,) + busy[k + 1:])
+            result.append(('' if self._symmetry else f'#{i}', new_busy))
+            if self._symmetry:
+                break
+        return result
+
+    @staticmethod
+    def _accelerate(state, ancestor):
+        """Return state with places that grew since ancestor set to OMEGA.
+
+        Only applies if the instances are in the same states and no place
+        has fewer tokens, so the steps in between can be repeated forever.
+        """
+        marking, busy = state
+        old_marking, old_busy = ancestor
+        if busy != old_busy or marking == old_marking:
+            return state
+        if any(m < o for m, o in zip(marking, old_marking)):
+            return state
+        return (tuple(OMEGA if m > o else m
+                      for m, o in zip(marking, old_marking)), busy)
+
+    def explore(self, marking=None):
+        """Explore all states from marking and return a Report."""
+        initial = self.initial_state(marking)
+        # Hashed state storage: state tuple -> index
+        index = {initial: 0}
+        states = [initial]
+        parents = [None]
+        dead = []
+        edges = 0
+        truncated = False
+        bounds = list(initial[0])
+        queue = deque([0])
+
+        # Breadth first keeps the paths to ancestors short
+        while queue:
+            current = queue.popleft()
+            successors = self.successors(states[current])
+            if not successors:
+                dead.append(current)
+            for label, state in successors:
+                edges += 1
+                ancestor = current
+                while ancestor is not None:
+                    state = self._accelerate(state, states[ancestor])
+                    parent = parents[ancestor]
+                    ancestor = parent[0] if parent else None
+                if state in index:
+                    continue
+                if len(states) >= Explorer.max_states:
+                    truncated = True
+                    continue
+                index[state] = len(states)
+                states.append(state)
+                parents.append((current, label))
+                bounds = [max(b, m) for b, m in zip(bounds, state[0])]
+                queue.append(index[state])
+
+        return Report(self._places, self._transitions, states, edges, dead,
+                      bounds, truncated, parents)
+
+
+def main():
+    """Parse arguments and print the report as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--net', default=net_definition.DEFAULT_PATH,
+                        help='net definition file')
+    parser.add_argument('--road', type=int, default=None,
+                        help='initial workers, default from the net')
+    parser.add_argument('--instances', nargs='*', default=[],
+                        help='Class=count of transition instances')
+    parser.add_argument('--no-symmetry', action='store_true')
+    parser.add_argument('--max-states', type=int,
+                        default=Explorer.max_states)
+    args = parser.parse_args()
+
+    definition = net_definition.load_definition(args.net)
+    instances = {}
+    for value in args.instances:
+        name, count = value.split('=')
+        instances[name] = int(count)
+    marking = None
+    if args.road is not None:
+        marking = {name: definition.get_initial(name)
+                   for name in definition.get_place_names}
+        marking['road'] = args.road
+
+    Explorer.max_states = args.max_states
+    explorer = Explorer(definition, instances, not args.no_symmetry)
+    print(json.dumps(explorer.explore(marking).to_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
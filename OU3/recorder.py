@@ -0,0 +1,158 @@
+"""Module for recording a simulation run as an append-only event log."""
+import json
+from itertools import count
+from threading import Lock
+
+import token_simsims as token
+
+# Event kinds
+PLACE = 'place'
+HOLD = 'hold'
+FIRE = 'fire'
+ADD = 'add'
+REMOVE = 'remove'
+MODE = 'mode'
+ADAPT = 'adapt'
+KEYFRAME = 'key'
+STOP = 'stop'
+
+PLACES = ('road', 'shed', 'magazine')
+# Token types in the order their counts are recorded
+TOKEN_TYPES = (token.Worker, token.Food, token.Product)
+
+
+def place_name(place_):
+    """Return the net definition name of a place."""
+    return type(place_).__name__.lower()
+
+
+def held_tokens(trans):
+    """Return the number of workers, food and products a transition holds."""
+    return [trans.count_tokens(type_) for type_ in TOKEN_TYPES]
+
+
+def transition_mode(trans):
+    """Return the name of a transition's mode, None if it has no mode."""
+    mode = getattr(trans, 'get_mode', None)
+    return mode.name if mode else None
+
+
+class Recorder():
+    """Writes token movements, firings and adapt decisions as JSON lines.
+
+    Every line is one event with the simulated time t and the kind e.
+    Events hold absolute values, a place event has the amount of tokens
+    the place holds after the move and a hold event the tokens held by a
+    transition, so replaying never drifts. A keyframe with the full state
+    is written every keyframe_interval simulated seconds, so a player can
+    seek to a time by replaying from the keyframe before it.
+    """
+
+    keyframe_interval = 10
+
+    def __init__(self, path):
+        """Open path for writing, events are recorded once attached."""
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = Lock()
+        self._sim = None
+        self._ids = {}
+        self._next_id = count()
+        self._last_keyframe = None
+        self._events = 0
+
+    @property
+    def get_events(self):
+        """Return the number of events written."""
+        return self._events
+
+    @property
+    def is_closed(self):
+        """Return True if the log is closed."""
+        return self._file.closed
+
+    def attach(self, sim):
+        """Record events of sim."""
+        self._sim = sim
+
+    def place(self, place_):
+        """Record the amount of tokens in a place after a move."""
+        self._record(PLACE, lambda: {'p': place_name(place_),
+                                     'n': place_.get_amount})
+
+    def hold(self, trans):
+        """Record the tokens held by a transition after it took or released some."""
+        self._record(HOLD, lambda: {'id': self._id(trans),
+                                    'n': held_tokens(trans)})
+
+    def fire(self, trans):
+        """Record a firing of a transition."""
+        self._record(FIRE, lambda: {'id': self._id(trans)})
+
+    def add(self, trans):
+        """Record a transition added to the simulation."""
+        self._record(ADD, lambda: {'id': self._id(trans),
+                                   'type': type(trans).__name__,
+                                   'mode': transition_mode(trans)})
+
+    def remove(self, trans):
+        """Record a transition removed from the simulation."""
+        self._record(REMOVE, lambda: {'id': self._ids.pop(id(trans), None)})
+
+    def mode(self, trans):
+        """Record a changed transition mode."""
+        self._record(MODE, lambda: {'id': self._id(trans),
+                                    'mode': transition_mode(trans)})
+
+    def adapt(self, passes):
+        """Record the start of an adapt pass with the amounts it adapts to."""
+        self._record(ADAPT, lambda: {'pass': passes,
+                                     'places': self._place_amounts()})
+
+    def stop(self):
+        """Write a last keyframe and close the log."""
+        with self._lock:
+            if self._file.closed or not self._sim:
+                return
+            self._write(STOP, self._keyframe())
+            self._file.close()
+
+    def _record(self, kind, fields):
+        """Write an event, fields is called with the log locked."""
+        with self._lock:
+            if self._file.closed or not self._sim:
+                return
+            now = self._sim.get_clock.now()
+            if (self._last_keyframe is None
+                    or now - self._last_keyframe >= Recorder.keyframe_interval):
+                self._last_keyframe = now
+                self._write(KEYFRAME, self._keyframe())
+                self._file.flush()
+            self._write(kind, fields())
+
+    def _write(self, kind, fields):
+        """Write one event line. Must be called with the log locked."""
+        event = {'t': round(self._sim.get_clock.now(), 3), 'e': kind}
+        event.update(fields)
+        self._file.write(json.dumps(event, separators=(',', ':')) + '\n')
+        self._events += 1
+
+    def _id(self, trans):
+        """Return the id of a transition in the log, assign one if it has none."""
+        if id(trans) not in self._ids:
+            self._ids[id(trans)] = next(self._next_id)
+        return self._ids[id(trans)]
+
+    def _place_amounts(self):
+        """Return the amount of tokens in every place."""
+        return {place_name(place_): place_.get_amount
+                for place_ in (self._sim.get_road, self._sim.get_shed,
+                               self._sim.get_magazine)}
+
+    def _keyframe(self):
+        """Return the fields of a keyframe with the full state."""
+        return {
+            'places': self._place_amounts(),
+            'transitions': [[self._id(trans), type(trans).__name__,
+                             held_tokens(trans), transition_mode(trans)]
+                            for trans in self._sim.get_transitions()],
+        }
@@ -0,0 +1,143 @@
+"""Module for rendering simulations to image files without a display.
+
+Usage: python render_ui.py [--log run.jsonl] [--out frames] [--fps 2]
+                           [--format png|svg] [--duration 60] [--time-scale 100]
+
+Renders a run recorded by a Recorder if a log is given, otherwise runs a
+new headless simulation in fast simulated time.
+"""
+import argparse
+import os
+import time
+
+import player
+import sim_clock
+import simulation
+from simsimsui import (GUINodeComponent, GUIPlaceDrawer, GUITransitionDrawer,
+                       GUIArcDrawer, GUITokenDrawer, SimSimsUI, UIArcComponent,
+                       UIComponent)
+from virtual_canvas import VirtualCanvas
+
+FORMATS = ('png', 'svg')
+
+
+class RenderUI(SimSimsUI):
+    """A UI drawing with the GUI drawers and layout on a VirtualCanvas.
+
+    Frames look like the SimSimsGUI window and are saved with save_frame.
+    """
+
+    def __init__(self, w=700, h=700):
+        SimSimsUI.__init__(self)
+        self._canvas = VirtualCanvas(w, h)
+
+    @property
+    def canvas(self):
+        """ The canvas used for drawing objects. """
+        return self._canvas
+
+    def _create_place_ui(self, properties):
+        return GUINodeComponent(GUIPlaceDrawer(self.canvas, properties))
+
+    def _create_transition_ui(self, properties):
+        return GUINodeComponent(GUITransitionDrawer(self.canvas, properties))
+
+    def _create_token_ui(self, properties):
+        return UIComponent(GUITokenDrawer(self.canvas, properties))
+
+    def _create_arc_ui(self, src_d, dst_d, properties):
+        return UIArcComponent(src_d, dst_d, GUIArcDrawer(self.canvas, properties))
+
+    def update_ui(self):
+        """Overrides from SimSimsUI. Frames are drawn by save_frame."""
+
+    def shoot(self):
+        """Overrides from SimSimsUI. Nothing to close."""
+
+    def save_frame(self, path, fmt='png'):
+        """Write the canvas to path as a png or svg image."""
+        if fmt == 'png':
+            with open(path, 'wb') as f:
+                f.write(self._canvas.to_png())
+        elif fmt == 'svg':
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._canvas.to_svg())
+        else:
+            raise ValueError(f'Unknown format {fmt}')
+
+
+def frame_path(out_dir, index, fmt):
+    """Return the path of frame number index."""
+    return os.path.join(out_dir, f'frame_{index:05d}.{fmt}')
+
+
+def render_log(log, out_dir, fps=2, fmt='png', start=0, end=None,
+               w=700, h=700):
+    """Render a recorded run, fps frames per simulated second.
+
+    Return the number of frames written.
+    """
+    ui = RenderUI(w, h)
+    player_ = player.Player.from_file(log, ui)
+    end = player_.get_end_time if end is None else end
+    frames = int((end - start) * fps) + 1
+    for index in range(frames):
+        player_.seek(start + index / fps)
+        ui.save_frame(frame_path(out_dir, index, fmt), fmt)
+    return frames
+
+
+def render_simulation(out_dir, duration, fps=2, fmt='png', time_scale=100,
+                      initial_workers=10, seed=None, w=700, h=700):
+    """Run a new simulation for duration simulated seconds and render it.
+
+    The simulation runs time_scale times faster than real time, a frame
+    is written every 1/fps simulated seconds. Return the number of frames
+    written.
+    """
+    ui = RenderUI(w, h)
+    clock = sim_clock.SimClock(time_scale)
+    sim = simulation.Simulation(os.path.join(out_dir, 'sim.json'),
+                                initial_workers, ui, seed=seed, clock=clock)
+    sim.start()
+    frames = int(duration * fps) + 1
+    for index in range(frames):
+        while clock.now() < index / fps:
+            time.sleep(0.5 / fps / time_scale)
+        ui.save_frame(frame_path(out_dir, index, fmt), fmt)
+    sim.stop()
+    sim.join()
+    return frames
+
+
+def main():
+    """Parse arguments and render frames."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log', help='event log written by a Recorder')
+    parser.add_argument('--out', default='frames',
+                        help='directory to write frames to')
+    parser.add_argument('--fps', type=float, default=2,
+                        help='frames per simulated second')
+    parser.add_argument('--format', default='png', choices=FORMATS)
+    parser.add_argument('--duration', type=float, default=60,
+                        help='simulated seconds to run a new simulation')
+    parser.add_argument('--time-scale', type=float, default=100,
+                        help='speed of a new simulation relative to real time')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    if args.log:
+        frames = render_log(args.log, args.out, args.fps, args.format)
+    else:
+        frames = render_simulation(args.out, args.duration, args.fps,
+                                   args.format, args.time_scale,
+                                   seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f'{frames} frames in {elapsed:.1f} s '
+          f'({frames / elapsed:.1f} frames/s)')
+
+
+if __name__ == '__main__':
+    main()
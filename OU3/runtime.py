@@ -0,0 +1,42 @@
+"""Module for runtimes that drive the transitions of a simulation."""
+
+
+class ThreadRuntime():
+    """Run every transition in its own OS thread."""
+
+    def start(self, clock):
+        """Prepare the runtime before any transition is started."""
+
+    def start_transition(self, trans):
+        """Start running a transition."""
+        trans.start()
+
+    def stop_transition(self, trans):
+        """Ask a transition to finish and wait until it has."""
+        trans.finish_thread()
+        if trans.is_alive():
+            trans.join()
+
+    def close(self):
+        """Release the resources of the runtime."""
+
+
+def _async_runtime():
+    """Create an AsyncRuntime, asyncio is only imported when one is used."""
+    import async_runtime
+    return async_runtime.AsyncRuntime()
+
+
+def __getattr__(name):
+    """Import AsyncRuntime from async_runtime on first use."""
+    if name == 'AsyncRuntime':
+        import async_runtime
+        return async_runtime.AsyncRuntime
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# Runtime name -> callable creating the runtime
+RUNTIMES = {
+    'thread': ThreadRuntime,
+    'async': _async_runtime,
+}
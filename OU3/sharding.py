@@ -0,0 +1,226 @@
+"""Module for running a region of villages, one simulation per process.
+
+Neighbouring villages exchange workers between their roads through
+inter-process queues. Run as a script, for example:
+
+    python sharding.py --villages 4 --topology ring --migration-rate 0.01
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+
+import ensemble
+import sim_clock
+import simulation
+import token_simsims as token
+import transition
+from headless_ui import HeadlessUI
+
+
+def line_topology(num_villages):
+    """Return the neighbours of every village in a line."""
+    return [[n for n in (i - 1, i + 1) if 0 <= n < num_villages]
+            for i in range(num_villages)]
+
+
+def ring_topology(num_villages):
+    """Return the neighbours of every village in a ring."""
+    if num_villages < 3:
+        return line_topology(num_villages)
+    return [[(i - 1) % num_villages, (i + 1) % num_villages]
+            for i in range(num_villages)]
+
+
+def grid_topology(num_villages):
+    """Return the neighbours of every village in an almost square grid."""
+    cols = max(1, round(num_villages ** 0.5))
+    neighbours = []
+    for i in range(num_villages):
+        row, col = divmod(i, cols)
+        candidates = [(row - 1, col), (row + 1, col),
+                      (row, col - 1), (row, col + 1)]
+        neighbours.append([r * cols + c for r, c in candidates
+                           if 0 <= c < cols and 0 <= r * cols + c < num_villages])
+    return neighbours
+
+
+TOPOLOGIES = {
+    'line': line_topology,
+    'ring': ring_topology,
+    'grid': grid_topology,
+}
+
+
+class Migration():
+    """Moves workers between the road of one village and its neighbours."""
+
+    def __init__(self, sim, inbox, outboxes, migration_rate, rng):
+        """Initialize migration.
+
+        outboxes maps neighbour index to the inbox queue of that neighbour.
+        migration_rate is the probability per simulated second that a worker
+        on the road leaves for one given neighbour.
+        """
+        self._sim = sim
+        self._inbox = inbox
+        self._outboxes = outboxes
+        self._migration_rate = migration_rate
+        self._rng = rng
+        self._emigrated = {neighbour: 0 for neighbour in outboxes}
+        self._immigrated = 0
+
+    @property
+    def get_emigrated(self):
+        """Return the number of workers sent per neighbour."""
+        return dict(self._emigrated)
+
+    @property
+    def get_immigrated(self):
+        """Return the number of workers received."""
+        return self._immigrated
+
+    def emigrate(self, interval):
+        """Send workers from the road to neighbours for interval seconds."""
+        road = self._sim.get_road
+        probability = min(1, self._migration_rate * interval)
+        for neighbour, outbox in self._outboxes.items():
+            leaving = sum(self._rng.random() < probability
+                          for _ in range(road.get_amount))
+            for _ in range(leaving):
+                try:
+                    worker = road.remove()
+                except RuntimeError:
+                    break
+                outbox.put(worker.to_dict())
+                self._sim.get_token_pool.release(worker)
+                self._emigrated[neighbour] += 1
+
+    def immigrate(self):
+        """Add every worker waiting in the inbox to the road."""
+        road = self._sim.get_road
+        while True:
+            try:
+                data = self._inbox.get_nowait()
+            except queue.Empty:
+                return
+            worker = self._sim.get_token_pool.acquire(token.Worker)
+            worker.health = data['health']
+            road.add(worker)
+            self._immigrated += 1
+
+
+def run_village(index, seed, inbox, outboxes, results, duration, speed,
+                initial_workers, migration_rate, migration_interval):
+    """Run one village until duration simulated seconds have passed.
+
+    Put a summary dictionary on the results queue when done.
+    """
+    clock = sim_clock.SimClock(speed)
+    timer = clock.create_timer()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            sim = simulation.Simulation(os.devnull, initial_workers,
+                                        HeadlessUI(), seed, clock=clock)
+            # The simulation's master stream is random.Random(seed), a
+            # distinct seed keeps migration draws apart from the transitions'
+            migration = Migration(sim, inbox, outboxes, migration_rate,
+                                  random.Random(f'{seed}-migration'))
+            sim.start()
+            populations = []
+            while clock.now() < duration:
+                timer.wait(migration_interval)
+                migration.immigrate()
+                migration.emigrate(migration_interval)
+                populations.append(ensemble.count_population(sim))
+            firings = {trans_type.__name__: sim.get_firings(trans_type)
+                       for trans_type in transition.TRANSITION_TYPES}
+            sim.stop()
+            sim.join()
+
+    for outbox in outboxes.values():
+        # Workers still queued when a neighbour has finished are lost in transit
+        outbox.cancel_join_thread()
+    results.put({
+        'village': index,
+        'seed': seed,
+        'mean_population': sum(populations) / len(populations),
+        'final_population': populations[-1],
+        'emigrated': sum(migration.get_emigrated.values()),
+        'immigrated': migration.get_immigrated,
+        'firings': firings,
+    })
+
+
+def run_region(num_villages, duration, speed=10, topology='ring',
+               initial_workers=10, migration_rate=0.01, migration_interval=1,
+               seed=None):
+    """Run a region of villages, each in its own process.
+
+    Return the village summaries sorted by village index and region totals.
+    """
+    neighbours = TOPOLOGIES[topology](num_villages)
+    master = random.Random(seed)
+    seeds = [master.getrandbits(64) for _ in range(num_villages)]
+    context = multiprocessing.get_context()
+    inboxes = [context.Queue() for _ in range(num_villages)]
+    results = context.Queue()
+
+    processes = []
+    for index in range(num_villages):
+        outboxes = {n: inboxes[n] for n in neighbours[index]}
+        process = context.Process(
+            target=run_village, name=f'Village-{index}',
+            args=(index, seeds[index], inboxes[index], outboxes, results,
+                  duration, speed, initial_workers, migration_rate,
+                  migration_interval))
+        process.start()
+        processes.append(process)
+
+    villages = sorted((results.get() for _ in processes),
+                      key=lambda summary: summary['village'])
+    for process in processes:
+        process.join()
+
+    emigrated = sum(village['emigrated'] for village in villages)
+    immigrated = sum(village['immigrated'] for village in villages)
+    return {
+        'villages': villages,
+        'final_population': sum(v['final_population'] for v in villages),
+        'emigrated': emigrated,
+        'immigrated': immigrated,
+        'in_transit': emigrated - immigrated,
+    }
+
+
+def main():
+    """Parse arguments and print the region summary as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--villages', type=int, default=os.cpu_count())
+    parser.add_argument('--topology', choices=sorted(TOPOLOGIES),
+                        default='ring')
+    parser.add_argument('--duration', type=float, default=300,
+                        help='simulated seconds per village')
+    parser.add_argument('--speed', type=float, default=10,
+                        help='time scale of every village clock')
+    parser.add_argument('--initial-workers', type=int, default=10)
+    parser.add_argument('--migration-rate', type=float, default=0.01,
+                        help='chance per second that a road worker leaves '
+                             'for one given neighbour')
+    parser.add_argument('--migration-interval', type=float, default=1,
+                        help='simulated seconds between migrations')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    region = run_region(args.villages, args.duration, args.speed,
+                        args.topology, args.initial_workers,
+                        args.migration_rate, args.migration_interval,
+                        args.seed)
+    print(json.dumps(region, indent=2))
+
+
+if __name__ == '__main__':
+    main()
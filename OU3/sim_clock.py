@@ -0,0 +1,144 @@
+"""Module for the simulation clock that all waits in a simulation go through."""
+from threading import Condition, Lock
+from time import monotonic
+from weakref import WeakSet
+
+
+class SimClock():
+    """A clock running simulated time at an adjustable scale.
+
+    A time scale of 1 runs in real time, 10 runs ten times faster and 0
+    pauses the simulation.
+    """
+
+    SPEEDS = (0.5, 1, 10, 100)
+
+    def __init__(self, time_scale=1):
+        """Initialize simulation clock."""
+        if time_scale < 0:
+            raise ValueError('time_scale must not be negative')
+        self._lock = Lock()
+        # (simulated time, real time, scale) at the last scale change
+        self._base = (0.0, monotonic(), time_scale)
+        self._paused_scale = 1
+        self._timers = WeakSet()
+        self._listeners = []
+
+    @property
+    def get_time_scale(self):
+        """Return the current time scale, 0 if paused."""
+        return self._base[2]
+
+    @property
+    def is_paused(self):
+        """Return True if the clock is paused."""
+        return self._base[2] == 0
+
+    def now(self):
+        """Return the current simulated time in seconds."""
+        sim_time, real_time, scale = self._base
+        return sim_time + (monotonic() - real_time) * scale
+
+    def set_time_scale(self, time_scale):
+        """Change the time scale and wake all waits to rescale them."""
+        if time_scale < 0:
+            raise ValueError('time_scale must not be negative')
+        with self._lock:
+            self._base = (self.now(), monotonic(), time_scale)
+            timers = list(self._timers)
+            listeners = list(self._listeners)
+        for timer in timers:
+            timer.notify()
+        for callback in listeners:
+            callback(time_scale)
+
+    def pause(self):
+        """Pause the clock."""
+        if not self.is_paused:
+            self._paused_scale = self.get_time_scale
+            self.set_time_scale(0)
+
+    def resume(self):
+        """Resume the clock at the scale it had before it was paused."""
+        if self.is_paused:
+            self.set_time_scale(self._paused_scale)
+
+    def toggle_pause(self):
+        """Pause the clock if it is running, otherwise resume it."""
+        if self.is_paused:
+            self.resume()
+        else:
+            self.pause()
+
+    def faster(self):
+        """Switch to the next faster speed in SPEEDS."""
+        faster = [s for s in SimClock.SPEEDS if s > self.get_time_scale]
+        if faster:
+            self.set_time_scale(faster[0])
+
+    def slower(self):
+        """Switch to the next slower speed in SPEEDS."""
+        slower = [s for s in SimClock.SPEEDS if 0 < s < self.get_time_scale]
+        if slower:
+            self.set_time_scale(slower[-1])
+
+    def add_listener(self, callback):
+        """Call callback(time_scale) every time the time scale changes."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def create_timer(self):
+        """Create and return a ClockTimer that waits in simulated time."""
+        timer = ClockTimer(self)
+        with self._lock:
+            self._timers.add(timer)
+        return timer
+
+
+class ClockTimer():
+    """A threading.Event replacement whose waits run in simulated time."""
+
+    def __init__(self, clock):
+        """Initialize clock timer."""
+        self._clock = clock
+        self._cond = Condition(Lock())
+        self._flag = False
+
+    def is_set(self):
+        """Return True if the timer is set."""
+        return self._flag
+
+    def set(self):
+        """Set the timer and wake everyone waiting for it."""
+        with self._cond:
+            self._flag = True
+            self._cond.notify_all()
+
+    def clear(self):
+        """Clear the timer."""
+        with self._cond:
+            self._flag = False
+
+    def notify(self):
+        """Wake all waits so they recompute their remaining time."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, duration=None):
+        """Wait until set or until duration simulated seconds have passed.
+
+        Return True if the timer is set.
+        """
+        with self._cond:
+            if duration is None:
+                while not self._flag:
+                    self._cond.wait()
+                return True
+            deadline = self._clock.now() + duration
+            while not self._flag:
+                remaining = deadline - self._clock.now()
+                if remaining <= 0:
+                    break
+                scale = self._clock.get_time_scale
+                self._cond.wait(remaining / scale if scale else None)
+            return self._flag
@@ -0,0 +1,136 @@
+"""Module for the structured, asynchronous diagnostics log of the simulation.
+
+Modules log events to loggers below 'simsims', with the event name as
+message and its data as fields:
+
+    _log = simlog.get_logger('place')
+    _log.debug('need_to_adapt', extra=simlog.fields(place='Shed', adapt=True))
+
+Nothing below WARNING is written until start() is called. start() puts
+a queue between the loggers and the output, so logging threads only
+enqueue records and a listener thread formats and writes them.
+"""
+import json
+import logging
+import queue
+import sys
+from threading import Lock
+
+ROOT = 'simsims'
+
+_listener = None
+_handler = None
+
+
+def get_logger(name):
+    """Return the logger of a module, below the simsims logger."""
+    return logging.getLogger(f'{ROOT}.{name}')
+
+
+def fields(**data):
+    """Return the extra argument that attaches data to a log record."""
+    return {'fields': data}
+
+
+class SamplingFilter(logging.Filter):
+    """Let through one in rate records of every event below WARNING.
+
+    Passed records get a sample_rate attribute, so every written record
+    stands for sample_rate events.
+    """
+
+    def __init__(self, rate=1):
+        """Initialize filter."""
+        super().__init__()
+        if rate < 1:
+            raise ValueError(f'Sample rate must be at least 1, got {rate}')
+        self._rate = rate
+        self._counts = {}
+        self._lock = Lock()
+
+    def filter(self, record):
+        """Return True if the record should be logged."""
+        record.sample_rate = 1
+        if self._rate == 1 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        # Records are filtered in the threads that log them
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+        record.sample_rate = self._rate
+        return seen % self._rate == 0
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as one JSON object per line."""
+
+    def format(self, record):
+        """Return the record as a JSON line."""
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'thread': record.threadName,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if getattr(record, 'sample_rate', 1) > 1:
+            entry['sample_rate'] = record.sample_rate
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format a record as a line of text with its fields as key=value."""
+
+    def __init__(self):
+        """Initialize formatter."""
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        """Return the record as a line of text."""
+        text = super().format(record)
+        data = dict(getattr(record, 'fields', {}))
+        if getattr(record, 'sample_rate', 1) > 1:
+            data['sample_rate'] = record.sample_rate
+        return ' '.join([text] + [f'{key}={value}'
+                                  for key, value in data.items()])
+
+
+def start(stream=None, level=logging.INFO, json_format=False, sample_rate=1):
+    """Write simsims log records to stream, stderr by default.
+
+    Records below level are dropped in the logging thread. Of the
+    records below WARNING, one in sample_rate per event is written.
+    Return the queue listener, call stop to flush and end it.
+    """
+    global _listener, _handler
+    # Imported here, logging.handlers pulls in socket and pickle, which
+    # headless starts that never log do not need
+    import logging.handlers
+    stop()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter() if json_format else TextFormatter())
+    records = queue.SimpleQueue()
+    _handler = logging.handlers.QueueHandler(records)
+    _handler.addFilter(SamplingFilter(sample_rate))
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    logger.addHandler(_handler)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    return _listener
+
+
+def stop():
+    """Write all queued records and stop the listener, if started."""
+    global _listener, _handler
+    if _listener:
+        _listener.stop()
+        logger = logging.getLogger(ROOT)
+        logger.removeHandler(_handler)
+        logger.propagate = True
+        _listener = _handler = None
@@ -1,39 +1,111 @@
 import json
+import time
+from threading import Thread
 
+import lock_debug
+import lock_profiler
+import recorder
+import simlog
+import simsimsui
 import simulation
+import transition
 
 
-def create_new_sim(save_file):
+def create_new_sim(save_file, gui=None, recorder_=None):
     """Create and return a new simulation that saves to save_file."""
-    sim = simulation.Simulation(save_file, 10)
+    sim = simulation.Simulation(save_file, 10, gui, recorder=recorder_)
     return sim
 
 
-def sim_from_json(load_file, save_file):
+def sim_from_json(load_file, save_file, gui=None, recorder_=None):
     """Create and return a sim from a json-file."""
     with open(load_file, 'r', encoding='utf-8') as f:
         data = f.read()
-    sim = simulation.Simulation.from_dict(json.loads(data), save_file)
+    sim = simulation.Simulation.from_dict(json.loads(data), save_file, gui,
+                                          recorder_)
     return sim
 
 
+def create_stream_ui(log_file):
+    """Create a diff-only text ui that streams to log_file."""
+    return simsimsui.SimSimsStreamUI(log_file, diff_only=True)
+
+
+def stream_frames(sims, interval):
+    """Write a frame of every running simulation each interval seconds."""
+    while any(sim.is_alive() for sim in sims):
+        for sim in sims:
+            sim.get_gui.update_ui()
+        time.sleep(interval)
+    for sim in sims:
+        sim.get_gui.shoot()
+
+
 new_sim = True
+profile_locks = False
+debug_locks = False
+watchdog_timeout = 30
+# Stream token counts to sim<i>.log instead of opening windows
+stream_ui = False
+stream_interval = 1
+# Record every run to sim<i>.jsonl, replay with player.py
+record_runs = False
+# Show all simulations in one window, in 'tabs' or side by side in a 'grid'
+shared_gui = False
+shared_gui_layout = 'tabs'
+# Diagnostics log, written to stderr by a background thread
+log_level = 'INFO'
+log_json = False
+# Write one in log_sample_rate of each debug and info event
+log_sample_rate = 1
+# Send the weakest workers to foodcourts and the healthiest to work
+health_dispatch = False
 
 if __name__ == '__main__':
+    simlog.start(level=log_level, json_format=log_json,
+                 sample_rate=log_sample_rate)
+    transition.Transition.health_dispatch = health_dispatch
+    profiler = lock_profiler.LockProfiler()
+    if profile_locks:
+        profiler.enable()
+    if debug_locks:
+        lock_debug.LockOrderMonitor().enable()
+
     sims = []
+    if stream_ui:
+        guis = [create_stream_ui(f'sim{i}.log') for i in range(2)]
+    elif shared_gui:
+        host = simsimsui.GUIHost(shared_gui_layout)
+        guis = [host.create_ui(f'Village {i}', 700, 700) for i in range(2)]
+    else:
+        guis = [None, None]
+    recorders = ([recorder.Recorder(f'sim{i}.jsonl') for i in range(2)]
+                 if record_runs else [None, None])
     if new_sim:
         for i in range(2):
-            sims.append(create_new_sim(f'sim{i}.json'))
+            sims.append(create_new_sim(f'sim{i}.json', guis[i], recorders[i]))
     else:
-        sims.append(sim_from_json('sim0.json', 'sim.json'))
-        sims.append(sim_from_json('sim1.json', 'sim2.json'))
+        sims.append(sim_from_json('sim0.json', 'sim.json', guis[0],
+                                  recorders[0]))
+        sims.append(sim_from_json('sim1.json', 'sim2.json', guis[1],
+                                  recorders[1]))
 
     for sim in sims:
         sim.start()
+        if debug_locks:
+            lock_debug.Watchdog(sim, watchdog_timeout).start()
+    if stream_ui:
+        Thread(target=stream_frames, args=(sims, stream_interval),
+               daemon=True).start()
 
     all_threads_closed = False
     while not all_threads_closed:
         input()
+        if stream_ui:
+            # There are no windows to close, Enter stops the simulations
+            for sim in sims:
+                sim.stop()
+                sim.join()
         all_threads_closed = True
         for sim in sims:
             if sim.is_alive():
@@ -43,3 +115,8 @@ if __name__ == '__main__':
 
     for sim in sims:
         sim.join()
+
+    if profile_locks:
+        print(profiler.format_report())
+        profiler.save('lock_profile.json')
+    simlog.stop()
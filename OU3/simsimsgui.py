@@ -0,0 +1,198 @@
+"""Module for the Tk windows of the SimSims user interface.
+
+Importing this module loads Tk, simsimsui imports it on first use of
+one of its classes.
+"""
+from tkinter import ttk
+
+import mtTkinter
+from simsimsui import (GUIArcDrawer, GUINodeComponent, GUIPlaceDrawer,
+                       GUITokenDrawer, GUITransitionDrawer, SimSimsUI,
+                       UIArcComponent, UIComponent)
+
+
+class SimSimsGUI(mtTkinter.Tk, SimSimsUI):
+    """ A Graphical UI. """
+
+    binds_keys = True
+
+    def __init__(self, w=400, h=400):
+        mtTkinter.Tk.__init__(self)
+
+        self.protocol("WM_DELETE_WINDOW", self._shoot)
+        # make Esc exit the program
+        self.bind('<Escape>', lambda e: self._shoot())
+
+        SimSimsUI.__init__(self)
+        self._canvas = mtTkinter.Canvas(self, width=w, height=h)
+        self._canvas.pack()
+        self.update()
+
+    @property
+    def canvas(self):
+        """ The canvas used for drawing objects. """
+        return self._canvas
+
+    def _create_place_ui(self, properties):
+        return GUINodeComponent(GUIPlaceDrawer(self.canvas, properties))
+
+    def _create_transition_ui(self, properties):
+        return GUINodeComponent(GUITransitionDrawer(self.canvas, properties))
+
+    def _create_token_ui(self, properties):
+        return UIComponent(GUITokenDrawer(self.canvas, properties))
+
+    def _create_arc_ui(self, src_d, dst_d, properties):
+        return UIArcComponent(src_d, dst_d, GUIArcDrawer(self.canvas, properties))
+
+    def _shoot(self):
+        """ Overrides from SimSimsUI """
+        SimSimsUI._shoot(self)
+        mtTkinter.Tk.iconify(self)
+
+    def update_ui(self):
+        """ Overrides from TokenUI """
+        if self.winfo_exists():
+            self.canvas.update()
+            self.update_idletasks()
+            self.update()
+
+    def shoot(self):
+        """ Overrides from SimSimsUI. """
+        mtTkinter.Tk.destroy(self)
+
+
+class GUIHost(mtTkinter.Tk):
+    """ A Tk root hosting the canvases of several simulations.
+
+        Every simulation gets a SimSimsCanvasUI in a tab or in a cell of
+        a grid, so all of them share one Tcl interpreter and one event
+        dispatcher instead of one each.
+        Args:
+            layout: 'tabs' or 'grid'
+            title: window title
+    """
+
+    LAYOUTS = ('tabs', 'grid')
+    grid_columns = 2
+
+    def __init__(self, layout='tabs', title='SimSims'):
+        if layout not in GUIHost.LAYOUTS:
+            raise ValueError(f'Unknown layout {layout}')
+        mtTkinter.Tk.__init__(self)
+        self.title(title)
+        self.protocol("WM_DELETE_WINDOW", self._shoot_all)
+
+        self._layout = layout
+        self._uis = []
+        if layout == 'tabs':
+            self._container = ttk.Notebook(self)
+        else:
+            self._container = mtTkinter.Frame(self)
+        self._container.pack(fill=mtTkinter.BOTH, expand=True)
+
+    @property
+    def uis(self):
+        """ The hosted UIs. """
+        return list(self._uis)
+
+    def create_ui(self, title=None, w=400, h=400):
+        """ Create a SimSimsCanvasUI in a new tab or grid cell.
+            Args:
+                title: tab or cell title, numbered if None
+                w, h: size of the canvas
+        """
+        index = len(self._uis)
+        title = title or f'Simulation {index + 1}'
+        frame = mtTkinter.Frame(self._container)
+        if self._layout == 'tabs':
+            self._container.add(frame, text=title)
+            # Map the tab so its canvas has a size to autoplace nodes in
+            self._container.select(frame)
+        else:
+            frame.grid(row=index // GUIHost.grid_columns,
+                       column=index % GUIHost.grid_columns)
+            mtTkinter.Label(frame, text=title).pack()
+
+        ui = SimSimsCanvasUI(self, frame, w, h)
+        self._uis.append(ui)
+        self.update()
+        return ui
+
+    def remove_ui(self, ui):
+        """ Remove a hosted UI, close the window when none is left. """
+        if ui not in self._uis:
+            return
+        self._uis.remove(ui)
+        if self._layout == 'tabs':
+            self._container.forget(ui.frame)
+        ui.frame.destroy()
+        if not self._uis:
+            mtTkinter.Tk.destroy(self)
+
+    def _shoot_all(self):
+        """ Signal a shoot to every hosted UI. """
+        for ui in list(self._uis):
+            ui._shoot()
+        mtTkinter.Tk.iconify(self)
+
+    def update_ui(self):
+        """ Process pending events of all hosted UIs. """
+        if self.winfo_exists():
+            self.update_idletasks()
+            self.update()
+
+
+class SimSimsCanvasUI(SimSimsUI):
+    """ A Graphical UI drawing on a canvas in a GUIHost.
+        Args:
+            host: the GUIHost
+            frame: the frame in the host to put the canvas in
+            w, h: size of the canvas
+    """
+
+    binds_keys = True
+
+    def __init__(self, host, frame, w=400, h=400):
+        SimSimsUI.__init__(self)
+        self._host = host
+        self._frame = frame
+        self._canvas = mtTkinter.Canvas(frame, width=w, height=h)
+        self._canvas.pack()
+        # Keys go to the canvas under the mouse
+        self._canvas.bind('<Enter>', lambda e: self._canvas.focus_set())
+        self._canvas.bind('<Escape>', lambda e: self._shoot())
+
+    @property
+    def canvas(self):
+        """ The canvas used for drawing objects. """
+        return self._canvas
+
+    @property
+    def frame(self):
+        """ The frame in the host holding the canvas. """
+        return self._frame
+
+    def bind(self, sequence, func):
+        """ Bind func to an event sequence on the canvas. """
+        self._canvas.bind(sequence, func)
+
+    def _create_place_ui(self, properties):
+        return GUINodeComponent(GUIPlaceDrawer(self.canvas, properties))
+
+    def _create_transition_ui(self, properties):
+        return GUINodeComponent(GUITransitionDrawer(self.canvas, properties))
+
+    def _create_token_ui(self, properties):
+        return UIComponent(GUITokenDrawer(self.canvas, properties))
+
+    def _create_arc_ui(self, src_d, dst_d, properties):
+        return UIArcComponent(src_d, dst_d, GUIArcDrawer(self.canvas, properties))
+
+    def update_ui(self):
+        """ Overrides from SimSimsUI. Updates the whole host. """
+        self._host.update_ui()
+
+    def shoot(self):
+        """ Overrides from SimSimsUI. """
+        self._host.remove_ui(self)
@@ -2,12 +2,21 @@ import io
 import sys
 from copy import copy, deepcopy
 from math import cos, pi, sin, sqrt
-from tkinter import font
-
-import mtTkinter
 
 """ A text and graphical user iterface for a SImSims network """
 
+# Classes that need Tk, they live in simsimsgui so that only programs
+# opening a window load Tk
+_GUI_CLASSES = ('SimSimsGUI', 'GUIHost', 'SimSimsCanvasUI')
+
+
+def __getattr__(name):
+    """ Import the Tk classes from simsimsgui on first use. """
+    if name in _GUI_CLASSES:
+        import simsimsgui
+        return getattr(simsimsgui, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 class Coords():
     ''' 
@@ -73,6 +82,11 @@ class SimSimsUI():
         places and transitions.
     '''
 
+    # False if the UI never shows tokens, so tokens need no UI objects
+    renders_tokens = True
+    # True if the UI has a bind(sequence, func) method for key bindings
+    binds_keys = False
+
     def __init__(self):
         self._uis = []
         self._on_shoot = None
@@ -318,8 +332,8 @@ class SimSimsTextUI(SimSimsUI):
     ''' A text UI. 
     '''
 
-    def __init__(self, channel=io.StringIO()):
-        self._fout = channel
+    def __init__(self, channel=None):
+        self._fout = channel if channel is not None else io.StringIO()
         SimSimsUI.__init__(self)
 
     def _create_place_ui(self, properties={}):
@@ -339,6 +353,82 @@ class SimSimsTextUI(SimSimsUI):
             self._fout.write("\n")
         self._fout.write("-----------------------------------\n")
         print(self._fout.getvalue(), file=sys.stdout)
+        # Only print each frame once
+        self._fout.seek(0)
+        self._fout.truncate()
+
+
+class SimSimsStreamUI(SimSimsUI):
+    ''' A text UI that writes every frame straight to a stream.
+
+        Args:
+            stream: file or terminal to write to, sys.stdout if None. If a
+                path is given, the file is opened and closed by the UI.
+            diff_only: if True, only write the nodes whose token counts
+                changed since the previous frame, one line per node as
+                "<frame> <lable>#<node id>: <counts>".
+    '''
+
+    def __init__(self, stream=None, diff_only=False):
+        self._owns_stream = isinstance(stream, str)
+        if self._owns_stream:
+            stream = open(stream, 'w', encoding='utf-8')
+        self._stream = stream if stream is not None else sys.stdout
+        self._diff_only = diff_only
+        self._counts = {}
+        # Node ui -> id that tells apart nodes with the same lable
+        self._ids = {}
+        self._next_id = 0
+        self._frame = 0
+        SimSimsUI.__init__(self)
+
+    def _create_place_ui(self, properties={}):
+        return UINodeComponent(TextUINodeDrawer(self._stream, "Place", properties))
+
+    def _create_transition_ui(self, properties={}):
+        return UINodeComponent(TextUINodeDrawer(self._stream, "Transition", properties))
+
+    def _create_token_ui(self, properties):
+        return UIComponent(TextUITokenDrawer(self._stream, properties))
+
+    def remove(self, ui):
+        """ Overrides from SimSimsUI. """
+        self._counts.pop(ui, None)
+        self._ids.pop(ui, None)
+        SimSimsUI.remove(self, ui)
+
+    def update_ui(self):
+        """ Overrides from SimSimsUI. """
+        self._frame += 1
+        uis = list(self._uis)
+        if self._diff_only:
+            for ui in uis:
+                tokens = ui.tokens
+                if self._counts.get(ui) != tokens:
+                    self._counts[ui] = tokens
+                    lable = ui.drawer.properties.get("lable", "?")
+                    self._stream.write(
+                        f"{self._frame} {lable}#{self._node_id(ui)}: {tokens}\n")
+        else:
+            self._stream.write(f"--------------- {self._frame} ---------------\n")
+            for ui in uis:
+                ui.draw()
+                self._stream.write("\n")
+        self._stream.flush()
+
+    def _node_id(self, ui):
+        """ Return the id of a node ui, assigned when it is first written. """
+        if ui not in self._ids:
+            self._ids[ui] = self._next_id
+            self._next_id += 1
+        return self._ids[ui]
+
+    def shoot(self):
+        """ Overrides from SimSimsUI. Closes the stream if it was opened here. """
+        if self._owns_stream:
+            self._stream.close()
+        else:
+            self._stream.flush()
 
 
 class TextUINodeDrawer(UIDrawer):
@@ -373,55 +463,6 @@ class TextUITokenDrawer(UIDrawer):
         self._fout.write("*")
 
 
-class SimSimsGUI(mtTkinter.Tk, SimSimsUI):
-    """ A Graphical UI. """
-
-    def __init__(self, w=400, h=400):
-        mtTkinter.Tk.__init__(self)
-
-        self.protocol("WM_DELETE_WINDOW", self._shoot)
-        # make Esc exit the program
-        self.bind('<Escape>', lambda e: self._shoot())
-
-        SimSimsUI.__init__(self)
-        self._canvas = mtTkinter.Canvas(self, width=w, height=h)
-        self._canvas.pack()
-        self.update()
-
-    @property
-    def canvas(self):
-        """ The canvas used for drawing objects. """
-        return self._canvas
-
-    def _create_place_ui(self, properties):
-        return GUINodeComponent(GUIPlaceDrawer(self.canvas, properties))
-
-    def _create_transition_ui(self, properties):
-        return GUINodeComponent(GUITransitionDrawer(self.canvas, properties))
-
-    def _create_token_ui(self, properties):
-        return UIComponent(GUITokenDrawer(self.canvas, properties))
-
-    def _create_arc_ui(self, src_d, dst_d, properties):
-        return UIArcComponent(src_d, dst_d, GUIArcDrawer(self.canvas, properties))
-
-    def _shoot(self):
-        """ Overrides from SimSimsUI """
-        SimSimsUI._shoot(self)
-        mtTkinter.Tk.iconify(self)
-
-    def update_ui(self):
-        """ Overrides from TokenUI """
-        if self.winfo_exists():
-            self.canvas.update()
-            self.update_idletasks()
-            self.update()
-
-    def shoot(self):
-        """ Overrides from SimSimsUI. """
-        mtTkinter.Tk.destroy(self)
-
-
 class GUINodeComponent(UINodeComponent):
     """A graphical node component. """
 
@@ -577,7 +618,8 @@ class GUINodeDrawer(GUIDrawer):
     """ An abstract graphical node drawer """
 
     def __init__(self, canvas, size, properties={}):
-        self._font = font.Font(family='Arial', size=7)
+        # A font tuple needs no Tk root, so drawers also work off screen
+        self._font = ('Arial', 7)
         self._radius = size
         GUIDrawer.__init__(self, canvas, properties)
 
@@ -617,7 +659,7 @@ class GUIPlaceDrawer(GUINodeDrawer):
         self.shapes.append((shape, coords))
         if "lable" in self.properties.keys():
             shape = self.canvas.create_text(
-                0.0, 0.0, text=self.properties["lable"], font=self._font, justify=mtTkinter.CENTER, fill=self.properties["color"])
+                0.0, 0.0, text=self.properties["lable"], font=self._font, justify='center', fill=self.properties["color"])
             coords = Coords(0.0, self._radius+7)
             self.shapes.append((shape, coords))
 
@@ -652,7 +694,7 @@ class GUITransitionDrawer(GUINodeDrawer):
         self._shapes.append((shape, coords, self.properties))
         if "lable" in self.properties.keys():
             shape = self.canvas.create_text(
-                0.0, 0.0, text=self.properties["lable"], font=self._font, justify=mtTkinter.CENTER, fill=self.properties["color"])
+                0.0, 0.0, text=self.properties["lable"], font=self._font, justify='center', fill=self.properties["color"])
             coords = Coords(0.0, self._radius+7)
             self.shapes.append((shape, coords))
 
@@ -695,9 +737,9 @@ class GUIArcDrawer(GUIDrawer):
         if not self.properties["arrows"]:
             return
         if b:
-            self.canvas.itemconfig(self._shapes[0][0], arrow=mtTkinter.BOTH)
+            self.canvas.itemconfig(self._shapes[0][0], arrow='both')
         else:
-            self.canvas.itemconfig(self._shapes[0][0], arrow=mtTkinter.LAST)
+            self.canvas.itemconfig(self._shapes[0][0], arrow='last')
         self._bidirectional = b
 
     def _define(self):
@@ -706,7 +748,7 @@ class GUIArcDrawer(GUIDrawer):
         coord2 = Coords(0.0, 0.0)
         arrow = None
         if self.properties["arrows"]:
-            arrow = mtTkinter.LAST
+            arrow = 'last'
         s = self.canvas.create_line(
             coord1[0], coord1[1], coord2[0], coord2[1], fill=self.properties["color"], width=3, arrow=arrow)
         self.shapes.append((s, None))
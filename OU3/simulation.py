@@ -1,32 +1,79 @@
 """Module for running a petri net simulation following SimSims rules."""
 import json
-from threading import Thread, Lock, Event
+import random
+from threading import Thread, Lock
 
+import adapt_policy
 import arc
+import net_definition
 import place
+import random_streams
+import runtime as runtime_
+import sim_clock
+import simlog
 import simsimsui
+import token_pool
 import transition
+from gui_node_interface import GUINodeInterface
+
+_log = simlog.get_logger('simulation')
 
 
 class Simulation(Thread):
     """Manages and keeps track of all objects in the simulation."""
 
-    def __init__(self, save_file, initial_workers=0):
-        """Initialize Simulation."""
+    adapt_interval = 10
+    adapt_debounce = 2
+
+    def __init__(self, save_file, initial_workers=0, gui=None, seed=None,
+                 policy=None, runtime=None, clock=None, net=None,
+                 recorder=None, antithetic=False):
+        """Initialize Simulation.
+
+        If no gui is given a SimSimsGUI window is created. Every transition
+        gets its own random stream derived from seed, a random seed is used
+        if none is given. policy is the AdaptPolicy used by adapt, by
+        default a ThresholdPolicy. runtime drives the transitions, by
+        default a ThreadRuntime with one thread per transition. clock is
+        the SimClock every wait goes through, by default one running in
+        real time. net is the NetDefinition that declares which places
+        each transition type is connected to, by default the SimSims net.
+        recorder is a Recorder that logs the run, none by default. With
+        antithetic the transitions draw from antithetic streams, so the run
+        mirrors the run with the same seed on plain streams.
+        """
         Thread.__init__(self)
-        self._gui = None
+        self._clock = clock or sim_clock.SimClock()
+        self._gui = gui
         self._create_gui()
 
         self._arc = arc.Arc(self)
-        self._road = place.Road(initial_workers, self._gui)
+        self._token_pool = token_pool.TokenPool(self._gui)
+        self._road = place.Road(initial_workers, self._gui, self._token_pool)
         self._shed = place.Shed(self._gui)
         self._magazine = place.Magazine(self._gui)
         self._transitions = []
+        self._net = net or net_definition.default_definition()
+        self._retired_firings = {}
+        self._retired_incidents = {}
+        self._antithetic = antithetic
+        self._seed = seed if seed is not None else random.randrange(2**32)
+        self._rng = random.Random(self._seed)
 
         self._save_file = save_file
         self._running = False
-        self._lock = Lock()
-        self._timer = Event()
+        self._lock = (GUINodeInterface.lock_factory('Simulation')
+                      if GUINodeInterface.lock_factory else Lock())
+        self._timer = self._clock.create_timer()
+        self._adapt_event = self._clock.create_timer()
+        self._adapt_passes = 0
+        self._policy = policy or adapt_policy.ThresholdPolicy()
+        self._runtime = runtime or runtime_.ThreadRuntime()
+        self._transitions_added = 0
+        self._transitions_removed = 0
+        self._recorder = recorder
+        if recorder:
+            recorder.attach(self)
 
     @property
     def get_road(self):
@@ -48,16 +95,90 @@ class Simulation(Thread):
         """Return the arc."""
         return self._arc
 
+    @property
+    def get_clock(self):
+        """Return the simulation clock."""
+        return self._clock
+
+    @property
+    def get_token_pool(self):
+        """Return the pool tokens are released to and reused from."""
+        return self._token_pool
+
+    @property
+    def get_recorder(self):
+        """Return the recorder, None if the simulation is not recorded."""
+        return self._recorder
+
+    @property
+    def get_net(self):
+        """Return the net definition."""
+        return self._net
+
+    @property
+    def get_seed(self):
+        """Return the master seed."""
+        return self._seed
+
+    @property
+    def is_antithetic(self):
+        """Return True if the transitions draw from antithetic streams."""
+        return self._antithetic
+
+    @property
+    def get_adapt_passes(self):
+        """Return the number of adapt passes run so far."""
+        return self._adapt_passes
+
+    @property
+    def get_transitions_added(self):
+        """Return the number of transitions added so far."""
+        return self._transitions_added
+
+    @property
+    def get_transitions_removed(self):
+        """Return the number of transitions removed so far."""
+        return self._transitions_removed
+
     @property
     def get_gui(self):
         """Return the gui."""
         return self._gui
 
+    def get_transitions(self):
+        """Return a copy of the list of transitions."""
+        self._lock.acquire()
+        transitions = list(self._transitions)
+        self._lock.release()
+        return transitions
+
     def get_num_of_transitions(self, trans_type):
         """Return the number of transitions of a specific type."""
         return len([trans for trans in self._transitions
                     if isinstance(trans, trans_type)])
 
+    def get_firings(self, trans_type):
+        """Return the number of firings by transitions of a specific type.
+
+        Firings of transitions that have been removed are included.
+        """
+        firings = self._retired_firings.get(trans_type, 0)
+        for trans in self.get_transitions():
+            if isinstance(trans, trans_type):
+                firings += trans.get_firings
+        return firings
+
+    def get_incidents(self, trans_type):
+        """Return the number of random incidents in transitions of a specific type.
+
+        Incidents of transitions that have been removed are included.
+        """
+        incidents = self._retired_incidents.get(trans_type, 0)
+        for trans in self.get_transitions():
+            if isinstance(trans, trans_type):
+                incidents += trans.get_incidents
+        return incidents
+
     def get_transition(self, trans_type):
         """Return the first occurence of transition with type: trans_type."""
         for trans in self._transitions:
@@ -65,10 +186,21 @@ class Simulation(Thread):
                 return trans
 
     def _create_gui(self):
-        """Create a gui class attribute."""
-        self._gui = simsimsui.SimSimsGUI(w=700, h=700)
+        """Create a gui class attribute unless one was given."""
+        if not self._gui:
+            self._gui = simsimsui.SimSimsGUI(w=700, h=700)
+        if self._gui.binds_keys:
+            self._bind_speed_keys()
         self._gui.on_shoot(self.stop)
 
+    def _bind_speed_keys(self):
+        """Bind space to pause/resume and +/- to change the speed."""
+        self._gui.bind('<space>', lambda _: self._clock.toggle_pause())
+        self._gui.bind('<plus>', lambda _: self._clock.faster())
+        self._gui.bind('<KP_Add>', lambda _: self._clock.faster())
+        self._gui.bind('<minus>', lambda _: self._clock.slower())
+        self._gui.bind('<KP_Subtract>', lambda _: self._clock.slower())
+
     def update_gui_positions(self):
         """Update positions of all gui elements."""
         self._lock.acquire()
@@ -106,27 +238,22 @@ class Simulation(Thread):
         trans.lock()
 
         self._transitions.append(trans)
+        self._transitions_added += 1
+        if not trans.is_rng_seeded:
+            trans.seed_rng(self._rng.getrandbits(64))
+        if self._antithetic:
+            trans.set_antithetic()
 
-        road_gui = self._road.get_gui_component
-        magazine_gui = self._magazine.get_gui_component
-        shed_gui = self._shed.get_gui_component
         transition_gui = trans.get_gui_component
-
-        self._gui.connect(road_gui, transition_gui, {'arrows': True})
-        self._gui.connect(transition_gui, road_gui, {'arrows': True})
-
-        if isinstance(trans, transition.Apartment):
-            self._gui.connect(magazine_gui, transition_gui, {
-                'arrows': True, 'color': '#6666ff'})
-        elif isinstance(trans, transition.Factory):
-            self._gui.connect(transition_gui, magazine_gui, {
-                'arrows': True, 'color': '#6666ff'})
-        elif isinstance(trans, transition.Farmland):
-            self._gui.connect(transition_gui, shed_gui, {
-                'arrows': True, 'color': '#00AA00'})
-        elif isinstance(trans, transition.Foodcourt):
-            self._gui.connect(shed_gui, transition_gui, {
-                'arrows': True, 'color': '#00AA00'})
+        inputs, outputs = self._net.connections(type(trans).__name__)
+        for place_name in inputs:
+            self._gui.connect(self._get_place(place_name).get_gui_component,
+                              transition_gui,
+                              self._net.arc_properties(place_name))
+        for place_name in outputs:
+            self._gui.connect(transition_gui,
+                              self._get_place(place_name).get_gui_component,
+                              self._net.arc_properties(place_name))
 
         self._lock.release()
         self._road.release()
@@ -135,133 +262,106 @@ class Simulation(Thread):
         trans.release()
 
         self.update_gui_positions()
+        if self._recorder:
+            self._recorder.add(trans)
 
         if self._running:
-            trans.start()
+            self._runtime.start_transition(trans)
+
+    def _get_place(self, place_name):
+        """Return the place called place_name in the net definition."""
+        places = {'road': self._road, 'shed': self._shed,
+                  'magazine': self._magazine}
+        if place_name not in places:
+            raise ValueError(f'Unknown place {place_name}')
+        return places[place_name]
 
     def remove_transition(self, trans):
         """End transition's process and remove it from the simulation."""
-        trans.finish_thread()
-        trans.join()
+        self._runtime.stop_transition(trans)
 
         self._lock.acquire()
         trans.lock()
 
         self._gui.remove(trans.get_gui_component)
         self._transitions.remove(trans)
+        self._transitions_removed += 1
+        self._retired_firings[type(trans)] = (
+            self._retired_firings.get(type(trans), 0) + trans.get_firings)
+        self._retired_incidents[type(trans)] = (
+            self._retired_incidents.get(type(trans), 0) + trans.get_incidents)
 
         trans.release()
         self._lock.release()
 
         self.update_gui_positions()
+        if self._recorder:
+            self._recorder.remove(trans)
+
+    def _on_threshold_crossed(self, place_, state):
+        """Schedule an adapt pass when a place crosses a threshold."""
+        self._adapt_event.set()
 
     def run(self):
-        """Start the simulation."""
+        """Start the simulation.
+
+        Adapt passes run when a place crosses one of its thresholds, after
+        waiting adapt_debounce seconds for the crossings to settle, and every
+        adapt_interval seconds while any place stays outside its thresholds.
+        Passes that would not change anything are skipped.
+        """
+        for place_ in (self._road, self._shed, self._magazine):
+            place_.subscribe(self._on_threshold_crossed)
+        self._runtime.start(self._clock)
         for trans in self._transitions:
-            trans.start()
+            self._runtime.start_transition(trans)
         self._running = True
         self.update_gui_positions()
+        self.adapt()
         while self._running:
-            self.adapt()
-            self._timer.wait(10)
-        print('Main loop stopped')
+            if self._adapt_event.wait(Simulation.adapt_interval):
+                self._timer.wait(Simulation.adapt_debounce)
+            self._adapt_event.clear()
+            if self._running and self._policy.needs_adapt(self):
+                self.adapt()
+        _log.info('main_loop_stopped', extra=simlog.fields(
+            adapt_passes=self._adapt_passes))
         for trans in self._transitions:
-            if trans.is_alive():
-                trans.join()
-        print('Simulation stopped')
+            # Transitions added by the last adapt pass may have missed stop()
+            self._runtime.stop_transition(trans)
+        self._runtime.close()
+        if self._recorder:
+            self._recorder.stop()
+        _log.info('simulation_stopped', extra=simlog.fields(seed=self._seed))
 
     def stop(self):
         """Set flags to stop the simulation. Save the simulation to file."""
-        print('Stopping')
+        _log.info('stopping', extra=simlog.fields(save_file=self._save_file))
         with open(self._save_file, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(self.to_dict()))
-        self._arc.set_timer()
+            f.write(json.dumps(self.snapshot()))
         for transition in self._transitions:
             transition.finish_thread()
         self._running = False
         self._timer.set()
+        self._adapt_event.set()
 
     def adapt(self):
         """Add/remove transitions or change apartment priority to balance the system."""
-        print('Adapting:')
-        # Check if any resources need to adapt
-        # ROADS - Controlled with apartments
-        if self._road.need_to_adapt():
-            # If there are too few workers, focus on reproduction or add one apartment
-            if self._road.get_amount < place.Place.threshold_min:
-                for trans in self._transitions:
-                    if isinstance(trans, transition.Apartment):
-                        if trans.get_mode == transition.ApartmentMode.MULTIPLY:
-                            apartment = transition.Apartment(
-                                self._gui, self._arc)
-                            apartment.set_mode(
-                                transition.ApartmentMode.MULTIPLY)
-                            self.add_transition(apartment)
-                            break
-                        trans.set_mode(transition.ApartmentMode.MULTIPLY)
-
-            # If there are too many workers, focus on resting or remove one apartment
-            else:
-                for trans in self._transitions:
-                    if isinstance(trans, transition.Apartment):
-                        if trans.get_mode == transition.ApartmentMode.REST:
-                            self.remove_transition(trans)
-                            break
-                        trans.set_mode(transition.ApartmentMode.REST)
-        # If there are enough workers, return apartments to neutral state.
-        else:
-            for trans in self._transitions:
-                if isinstance(trans, transition.Apartment):
-                    trans.set_mode(transition.ApartmentMode.NEUTRAL)
-
-        # SHEDS - Controlled with farmlands and foodcourts
-        if self._shed.need_to_adapt():
-            # If there are too few food, remove a foodcourt if possible, otherwise add a farmland
-            if self._shed.get_amount < place.Place.threshold_min:
-                if self.get_num_of_transitions(transition.Foodcourt) > 2:
-                    foodcourt = self.get_transition(transition.Foodcourt)
-                    self.remove_transition(foodcourt)
-                else:
-                    self.add_transition(
-                        transition.Farmland(self._gui, self._arc))
-            # If there are too many food, remove a farmland if possible, otherwise add a foodcourt
-            else:
-                if self.get_num_of_transitions(transition.Farmland) > 2:
-                    farmland = self.get_transition(transition.Farmland)
-                    self.remove_transition(farmland)
-                else:
-                    self.add_transition(
-                        transition.Foodcourt(self._gui, self._arc))
-
-        # MAGAZINE - Controlled with factories primarily and apartments secondarily
-        if self._magazine.need_to_adapt():
-            # If there are too many products, remove a factory is possible, otherwise add an apartment
-            if self._magazine.get_amount > place.Place.threshold_max:
-                if self.get_num_of_transitions(transition.Factory) > 2:
-                    factory = self.get_transition(transition.Factory)
-                    self.remove_transition(factory)
-                else:
-                    self.add_transition(
-                        transition.Apartment(self._gui, self._arc))
-            # If there are too few products, add a factory
-            else:
-                self.add_transition(transition.Factory(self._gui, self._arc))
-
-        # Check if there are enough of each transition
-        if self.get_num_of_transitions(transition.Apartment) < 2:
-            self.add_transition(transition.Apartment(self._gui, self._arc))
-        if self.get_num_of_transitions(transition.Factory) < 2:
-            self.add_transition(transition.Factory(self._gui, self._arc))
-        if self.get_num_of_transitions(transition.Farmland) < 2:
-            self.add_transition(transition.Farmland(self._gui, self._arc))
-        if self.get_num_of_transitions(transition.Foodcourt) < 2:
-            self.add_transition(transition.Foodcourt(self._gui, self._arc))
-
-        print()
+        self._adapt_passes += 1
+        if self._recorder:
+            self._recorder.adapt(self._adapt_passes)
+        self._policy.adapt(self)
+        _log.info('adapt', extra=simlog.fields(
+            adapt_pass=self._adapt_passes, road=self._road.get_amount,
+            shed=self._shed.get_amount, magazine=self._magazine.get_amount,
+            transitions=len(self._transitions)))
 
     def to_dict(self):
         """Serialize the simulation object to a dictionary."""
         return {
+            'seed': self._seed,
+            'antithetic': self._antithetic,
+            'rng': random_streams.state_to_list(self._rng),
             'road': self._road.to_dict(),
             'shed': self._shed.to_dict(),
             'magazine': self._magazine.to_dict(),
@@ -269,16 +369,41 @@ class Simulation(Thread):
                             for transition in self._transitions],
         }
 
+    def snapshot(self):
+        """Serialize the simulation consistently while it runs.
+
+        The simulation, its places and all transitions are locked while the
+        state is copied, so no token moves and none is counted twice.
+        """
+        self._lock.acquire()
+        nodes = [self._road, self._shed, self._magazine] + self._transitions
+        for node in nodes:
+            node.lock()
+        try:
+            return self.to_dict()
+        finally:
+            for node in reversed(nodes):
+                node.release()
+            self._lock.release()
+
     @classmethod
-    def from_dict(cls, data, save_file):
-        """Create a simulation object from a dictionary."""
-        sim = cls(save_file)
+    def from_dict(cls, data, save_file, gui=None, recorder=None, **options):
+        """Create a simulation object from a dictionary.
+
+        options are passed on to the constructor, for example policy or clock.
+        """
+        options.setdefault('antithetic', data.get('antithetic', False))
+        sim = cls(save_file, gui=gui, seed=data.get('seed'), recorder=recorder,
+                  **options)
+        if data.get('rng'):
+            random_streams.set_state(sim._rng, data['rng'])
 
         sim._road.remove_gui_component()
         sim._shed.remove_gui_component()
         sim._magazine.remove_gui_component()
 
-        sim._road = place.Road.from_dict(data['road'], sim.get_gui)
+        sim._road = place.Road.from_dict(data['road'], sim.get_gui,
+                                         sim.get_token_pool)
         sim._shed = place.Shed.from_dict(data['shed'], sim.get_gui)
         sim._magazine = place.Magazine.from_dict(data['magazine'], sim.get_gui)
 
@@ -0,0 +1,59 @@
+"""Module for reusing token objects instead of leaving them to the garbage collector."""
+from threading import Lock
+
+
+class TokenPool():
+    """Free lists of released tokens, one per token type.
+
+    A released token has its gui component removed right away, in the
+    releasing thread. Acquiring a token reuses a released one of the same
+    type if there is one and resets it, its gui component is created
+    again when it is needed.
+    """
+
+    max_free = 1000
+
+    def __init__(self, gui):
+        """Initialize token pool."""
+        self._gui = gui
+        self._free = {}
+        self._lock = Lock()
+        self._created = 0
+        self._reused = 0
+
+    @property
+    def get_created(self):
+        """Return the number of tokens created by the pool."""
+        return self._created
+
+    @property
+    def get_reused(self):
+        """Return the number of tokens reused from the free lists."""
+        return self._reused
+
+    def acquire(self, token_type):
+        """Return a token of token_type in its newly created state."""
+        with self._lock:
+            free = self._free.get(token_type)
+            token_ = free.pop() if free else None
+            if token_:
+                self._reused += 1
+            else:
+                self._created += 1
+        if token_:
+            token_.reset()
+            return token_
+        return token_type(self._gui)
+
+    def release(self, token_):
+        """Remove the gui component of a token that left the simulation and keep it for reuse."""
+        token_.remove_gui_component()
+        with self._lock:
+            free = self._free.setdefault(type(token_), [])
+            if len(free) < TokenPool.max_free:
+                free.append(token_)
+
+    def clear(self):
+        """Drop all free tokens."""
+        with self._lock:
+            self._free.clear()
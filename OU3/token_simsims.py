@@ -3,46 +3,69 @@ from gui_node_interface import GUINodeInterface
 
 
 class Token(GUINodeInterface):
-    """Parent class for all tokens."""
+    """Parent class for all tokens.
+
+    Tokens are the most numerous objects in a simulation, so they have no
+    __dict__ and get their gui component only when a gui that renders
+    tokens first asks for it.
+    """
+
+    __slots__ = ()
+
+    color = None
 
     def __init__(self, gui):
         """Initialize token."""
         GUINodeInterface.__init__(self, gui)
 
+    @property
+    def get_gui_component(self):
+        """Return the gui component, None if the gui does not render tokens.
+
+        The component is created on first use, call with the token locked.
+        """
+        if self._gui_component is None and self._gui.renders_tokens:
+            self._gui_component = self._gui.create_token_ui(
+                {'color': self.color})
+        return self._gui_component
+
+    def reset(self):
+        """Reset a released token to its newly created state."""
+
+    def _create_gui_component(self):
+        """Wait with creating the gui component until it is needed."""
+
 
 class Product(Token):
     """Product type token. Subclass to Token."""
 
+    __slots__ = ()
+
+    color = '#6666ff'
+
     def __init__(self, gui):
         """Initialize product."""
         super().__init__(gui)
 
-    def _create_gui_component(self):
-        """Create a red token gui component and add it to the gui."""
-        properties = {'color': '#6666ff'}
-        self.lock()
-        self._gui_component = self._gui.create_token_ui(properties)
-        self.release()
-
 
 class Food(Token):
     """Food type token. Subclass to Token."""
 
+    __slots__ = ()
+
+    color = '#00ff00'
+
     def __init__(self, gui):
         """Initialize Food."""
         super().__init__(gui)
 
-    def _create_gui_component(self):
-        """Create a green token gui component and add it to the gui."""
-        properties = {'color': '#00ff00'}
-        self.lock()
-        self._gui_component = self._gui.create_token_ui(properties)
-        self.release()
-
 
 class Worker(Token):
     """Worker type token. Subclass to Token."""
 
+    __slots__ = ('_health',)
+
+    color = '#000000'
     max_health = 100
 
     def __init__(self, gui):
@@ -50,6 +73,11 @@ class Worker(Token):
         super().__init__(gui)
         self._health = Worker.max_health
 
+    def reset(self):
+        """Reset a released worker to full health."""
+        super().reset()
+        self._health = Worker.max_health
+
     @property
     def get_health(self):
         """Return worker's health."""
@@ -73,14 +101,6 @@ class Worker(Token):
         self._health += amount
         self._health = min(self._health, Worker.max_health)
 
-    def _create_gui_component(self):
-        """Create a black token gui component and add it to the gui."""
-        properties = {'color': '#000000'}
-        self.lock()
-        self._gui_component = self._gui.create_token_ui(
-            properties)
-        self.release()
-
     def to_dict(self):
         """Serialize worker to a dictionary."""
         return {'health': self._health}
@@ -1,14 +1,32 @@
 """Module for transitions."""
 import random
 from enum import Enum, unique
-from threading import Event, Thread
+from threading import Thread
 
+import random_streams
+import simlog
+from arc import drive
 import token_simsims as token
+import worker_index
 from gui_node_interface import GUINodeInterface
 
+_log = simlog.get_logger('transition')
+
 
 class Transition(GUINodeInterface, Thread):
-    """Parent class for all transitions."""
+    """Parent class for all transitions.
+
+    The rules of a transition are written as generators that yield the
+    number of seconds to wait, so they can be driven by the transition's
+    own thread or by an event loop.
+    """
+
+    idle_time = 2
+    # Take workers from the road by worker_priority instead of oldest first
+    health_dispatch = False
+    worker_priority = None
+    # Properties of the transition's gui component
+    gui_properties = {}
 
     def __init__(self, gui, arc):
         """Initialize transition."""
@@ -18,41 +36,151 @@ class Transition(GUINodeInterface, Thread):
         self._tokens = []
         self._arc = arc
         self._stop_thread = False
-        self._timer = Event()
+        self._clock = arc.get_clock
+        self._timer = self._clock.create_timer()
+        self._last_progress = self._clock.now()
+        self._firings = 0
+        self._incidents = 0
+        self._rng = random.Random()
+        self._rng_seeded = False
+
+    @property
+    def is_rng_seeded(self):
+        """Return True if the random stream has been seeded or restored."""
+        return self._rng_seeded
+
+    def seed_rng(self, seed):
+        """Seed the transition's own random stream."""
+        self._rng.seed(seed)
+        self._rng_seeded = True
+
+    def set_antithetic(self):
+        """Mirror every later draw of the random stream, u becomes 1 - u."""
+        self._rng = random_streams.antithetic(self._rng)
+
+    def _rng_to_dict(self):
+        """Return the state of the random stream for to_dict."""
+        return random_streams.state_to_list(self._rng)
+
+    def _rng_from_dict(self, data):
+        """Restore the random stream saved by to_dict, if there is one."""
+        if data.get('rng'):
+            random_streams.set_state(self._rng, data['rng'])
+            self._rng_seeded = True
+
+    @property
+    def get_worker_priority(self):
+        """Return which worker to take from the road, None for the oldest."""
+        if Transition.health_dispatch:
+            return type(self).worker_priority
+        return None
+
+    @property
+    def get_firings(self):
+        """Return the number of times the transition has fired."""
+        return self._firings
+
+    @property
+    def get_incidents(self):
+        """Return the number of firings that ended in a random incident."""
+        return self._incidents
+
+    @classmethod
+    def incident_risk(cls):
+        """Return the known probability of an incident per firing.
+
+        None if the transition has no random incidents.
+        """
+        return None
+
+    @property
+    def get_last_progress(self):
+        """Return the simulated time of the last completed run loop."""
+        return self._last_progress
+
+    @property
+    def is_stopping(self):
+        """Return True if the transition has been asked to finish."""
+        return self._stop_thread
 
     def run(self):
         """Run the thread."""
+        drive(self.steps(), self._timer.wait)
+
+    def steps(self):
+        """Generator for the main loop. Yield the number of seconds to wait."""
         while not self._stop_thread:
-            if self._get_tokens():
-                self._trigger()
-                self._release_tokens()
+            if (yield from self._get_tokens()):
+                yield from self._trigger()
+                self._firings += 1
+                if self._arc.get_recorder:
+                    self._arc.get_recorder.fire(self)
+                yield from self._release_tokens()
+                self._record_hold()
             else:
-                self._timer.wait(2)
-        self._release_tokens()
-        print('Thread closed')
+                yield Transition.idle_time
+            self._last_progress = self._clock.now()
+        yield from self._release_tokens()
+        _log.debug('transition_closed', extra=simlog.fields(
+            transition=type(self).__name__, firings=self._firings))
 
     def finish_thread(self):
         """Set a flag for the thread to finish."""
         self._stop_thread = True
         self._timer.set()
 
+    def _create_gui_component(self):
+        """Create a gui component from gui_properties and add it to gui."""
+        self.lock()
+        self._gui_component = self._gui.create_transition_ui(
+            type(self).gui_properties)
+        self.release()
+
     def _add_token(self, token_):
         """Append a token to the tokens and add it to the gui."""
         self.lock()
         token_.lock()
-        self._gui_component.add_token(token_.get_gui_component)
+        self._add_token_ui(token_)
         self._tokens.append(token_)
         self.release()
         token_.release()
+        self._record_hold()
 
     def _remove_token(self, token_):
         """Remove a token and it's gui component."""
         self.lock()
         token_.lock()
-        self._gui_component.remove_token(token_.get_gui_component)
+        self._remove_token_ui(token_)
         self._tokens.remove(token_)
         self.release()
         token_.release()
+        self._record_hold()
+
+    def _record_hold(self):
+        """Record the tokens held, if the simulation is recorded."""
+        if self._arc.get_recorder:
+            self._arc.get_recorder.hold(self)
+
+    def count_tokens(self, type_):
+        """Return the number of held tokens of type type_."""
+        return len([token_ for token_ in self._tokens
+                    if isinstance(token_, type_)])
+
+    def _discard_token(self, token_):
+        """Remove a token that leaves the simulation and release it to the pool."""
+        self._remove_token(token_)
+        self._arc.get_token_pool.release(token_)
+
+    def _store_token(self, store, token_):
+        """Store a held token with an arc store, release it to the pool if refused.
+
+        The token stops being held under the lock of the place it is stored
+        in, so a snapshot taken under that lock sees it in one of them.
+        """
+        if not (yield from store(token_, self,
+                                 lambda: self._tokens.remove(token_))):
+            self._tokens.remove(token_)
+            self._arc.get_token_pool.release(token_)
 
     def _find_token(self, type_):
         """Return the first token of type type_. Return None if no token is found."""
@@ -62,12 +190,15 @@ class Transition(GUINodeInterface, Thread):
         return None
 
     def _get_tokens(self):
+        """Abstract generator fetching tokens. Return True if ready to fire."""
         raise NotImplementedError
 
     def _trigger(self):
+        """Abstract generator firing the transition."""
         raise NotImplementedError
 
     def _release_tokens(self):
+        """Abstract generator returning tokens to their places."""
         raise NotImplementedError
 
     def to_dict(self):
@@ -83,6 +214,8 @@ class Transition(GUINodeInterface, Thread):
 class Foodcourt(Transition):
     """Foodcourt type transition. Heals workers and consumes food."""
 
+    gui_properties = {'lable': 'Foodcourt', 'color': '#00FF00'}
+    worker_priority = worker_index.WEAKEST
     poisoning_risk = 0.01
     min_restore = 40
     max_restore = 70
@@ -92,55 +225,56 @@ class Foodcourt(Transition):
         """Initialize foodcourt."""
         super().__init__(gui, arc)
 
-    def _create_gui_component(self):
-        """Create a green transition gui component."""
-        parameters = {'lable': 'Foodcourt', 'color': '#00FF00'}
-        self.lock()
-        self._gui_component = self._gui.create_transition_ui(parameters)
-        self.release()
+    @classmethod
+    def incident_risk(cls):
+        """Overrides from Transition. Return the risk of poisoning."""
+        return Foodcourt.poisoning_risk
 
     def _get_tokens(self):
         """Fetch one worker and one food."""
         if not self._find_token(token.Worker):
-            if worker := self._arc.get_worker():
+            if worker := (yield from self._arc.get_worker(self.get_worker_priority)):
                 self._add_token(worker)
         if not self._find_token(token.Food):
-            if food := self._arc.get_food():
+            if food := (yield from self._arc.get_food()):
                 self._add_token(food)
         return self._find_token(token.Worker) and self._find_token(token.Food)
 
     def _trigger(self):
         """Consume one food and heal or poison worker."""
-        self._timer.wait(Foodcourt.production_time)
+        yield Foodcourt.production_time
 
-        health_diff = random.randint(
+        health_diff = self._rng.randint(
             Foodcourt.min_restore, Foodcourt.max_restore)
 
-        if random.random() < Foodcourt.poisoning_risk:
+        if self._rng.random() < Foodcourt.poisoning_risk:
+            self._incidents += 1
             self._find_token(token.Worker).decrease_health(health_diff)
         else:
             self._find_token(token.Worker).increase_health(health_diff//5)
 
-        self._remove_token(self._find_token(token.Food))
+        self._discard_token(self._find_token(token.Food))
 
     def _release_tokens(self):
         """Return tokens to their places."""
-        for token_ in self._tokens:
+        # A token stays held while it is carried, _store_token hands it
+        # over to its place
+        for token_ in list(self._tokens):
             self.lock()
             token_.lock()
-            self._gui_component.remove_token(token_.get_gui_component)
+            self._remove_token_ui(token_)
             token_.release()
             self.release()
             if isinstance(token_, token.Worker):
-                self._arc.store_worker(token_)
+                yield from self._store_token(self._arc.store_worker, token_)
             elif isinstance(token_, token.Food):
-                self._arc.store_food(token_)
-        self._tokens = []
+                yield from self._store_token(self._arc.store_food, token_)
 
     def to_dict(self):
         """Serialize foodcourt to a dictionary."""
         data = {
             'type': 'foodcourt',
+            'rng': self._rng_to_dict(),
             'worker': None,
             'food': 0,
         }
@@ -160,12 +294,15 @@ class Foodcourt(Transition):
 
         for _ in range(data['food']):
             foodcourt._add_token(token.Food(gui))
+        foodcourt._rng_from_dict(data)
         return foodcourt
 
 
 class Apartment(Transition):
     """Apartment type transition. Heals or creates workers and consumes products."""
 
+    gui_properties = {'lable': 'Apartment', 'color': '#000000'}
+    worker_priority = worker_index.WEAKEST
     health_restore = 20
     rest_time = 0.7
 
@@ -181,58 +318,56 @@ class Apartment(Transition):
 
     def set_mode(self, mode):
         """Set the mode of the apartment."""
+        changed = mode != self._mode
         self._mode = mode
-
-    def _create_gui_component(self):
-        """Create a black transition gui component."""
-        parameters = {'lable': 'Apartment', 'color': '#000000'}
-        self.lock()
-        self._gui_component = self._gui.create_transition_ui(parameters)
-        self.release()
+        if changed and self._arc.get_recorder:
+            self._arc.get_recorder.mode(self)
 
     def _get_tokens(self):
         """Fetch one product and one or two workers."""
         if not self._find_token(token.Product):
-            if product := self._arc.get_product():
+            if product := (yield from self._arc.get_product()):
                 self._add_token(product)
         if not self._find_token(token.Worker):
-            if worker := self._arc.get_worker():
+            if worker := (yield from self._arc.get_worker(self.get_worker_priority)):
                 self._add_token(worker)
-            if ((self._mode == ApartmentMode.NEUTRAL and random.random() < 0.5)
+            if ((self._mode == ApartmentMode.NEUTRAL and self._rng.random() < 0.5)
                     or self._mode == ApartmentMode.MULTIPLY):
-                if worker := self._arc.get_worker():
+                if worker := (yield from self._arc.get_worker(self.get_worker_priority)):
                     self._add_token(worker)
         return (self._find_token(token.Product)
                 and self._find_token(token.Worker))
 
     def _trigger(self):
         """If apartment has one worker, heal it. If apartment has two workers, create a third worker. Consumes the product."""
-        self._timer.wait(Apartment.rest_time)
+        yield Apartment.rest_time
         if len(self._tokens) == 3:  # Two workers and one product
-            self._add_token(token.Worker(self._gui))
+            self._add_token(self._arc.get_token_pool.acquire(token.Worker))
         else:
             self._find_token(token.Worker).increase_health(
                 Apartment.health_restore)
 
-        self._remove_token(self._find_token(token.Product))
+        self._discard_token(self._find_token(token.Product))
 
     def _release_tokens(self):
         """Return all tokens to their places."""
-        for token_ in self._tokens:
+        # A token stays held while it is carried, _store_token hands it
+        # over to its place
+        for token_ in list(self._tokens):
             token_.lock()
             self.lock()
-            self._gui_component.remove_token(token_.get_gui_component)
+            self._remove_token_ui(token_)
             self.release()
             token_.release()
             if isinstance(token_, token.Worker):
-                self._arc.store_worker(token_)
+                yield from self._store_token(self._arc.store_worker, token_)
             elif isinstance(token_, token.Product):
-                self._arc.store_product(token_)
-        self._tokens = []
+                yield from self._store_token(self._arc.store_product, token_)
 
     def to_dict(self):
         """Serialize apartment to a dictionary."""
         data = {'type': 'apartment',
+                'rng': self._rng_to_dict(),
                 'workers': [],
                 'products': 0,
                 'mode': self._mode.value,
@@ -255,12 +390,15 @@ class Apartment(Transition):
             apartment._add_token(token.Product(gui))
 
         apartment._mode = ApartmentMode(data['mode'])
+        apartment._rng_from_dict(data)
         return apartment
 
 
 class Farmland(Transition):
     """Farmland type transition. Produces food."""
 
+    gui_properties = {'lable': 'Farmland', 'color': '#9C7200'}
+    worker_priority = worker_index.HEALTHIEST
     risk = 0.05
     health_decrease = 20
     production_time = 1
@@ -269,47 +407,47 @@ class Farmland(Transition):
         """Initialize farmland."""
         super().__init__(gui, arc)
 
-    def _create_gui_component(self):
-        """Create a brown transition gui component."""
-        parameters = {'lable': 'Farmland', 'color': '#9C7200'}
-        self.lock()
-        self._gui_component = self._gui.create_transition_ui(parameters)
-        self.release()
+    @classmethod
+    def incident_risk(cls):
+        """Overrides from Transition. Return the risk of injury."""
+        return Farmland.risk
 
     def _get_tokens(self):
         """Fetch a worker."""
         if not self._find_token(token.Worker):
-            if worker := self._arc.get_worker():
+            if worker := (yield from self._arc.get_worker(self.get_worker_priority)):
                 self._add_token(worker)
         return bool(self._find_token(token.Worker))
 
     def _trigger(self):
         """Produce one food, has a risk of damaging the worker."""
-        self._timer.wait(Farmland.production_time)
-        food = token.Food(self._gui)
-        self._add_token(food)
-        if random.random() < Farmland.risk:
+        yield Farmland.production_time
+        self._add_token(self._arc.get_token_pool.acquire(token.Food))
+        if self._rng.random() < Farmland.risk:
+            self._incidents += 1
             self._find_token(token.Worker).decrease_health(
                 Farmland.health_decrease)
 
     def _release_tokens(self):
         """Return all tokens to their places."""
-        for token_ in self._tokens:
+        # A token stays held while it is carried, _store_token hands it
+        # over to its place
+        for token_ in list(self._tokens):
             self.lock()
             token_.lock()
-            self._gui_component.remove_token(token_.get_gui_component)
+            self._remove_token_ui(token_)
             token_.release()
             self.release()
             if isinstance(token_, token.Worker):
-                self._arc.store_worker(token_)
+                yield from self._store_token(self._arc.store_worker, token_)
             elif isinstance(token_, token.Food):
-                self._arc.store_food(token_)
-        self._tokens = []
+                yield from self._store_token(self._arc.store_food, token_)
 
     def to_dict(self):
         """Serialize farmland to a dictionary."""
         data = {
             'type': 'farmland',
+            'rng': self._rng_to_dict(),
             'worker': None,
             'food': 0,
         }
@@ -329,12 +467,15 @@ class Farmland(Transition):
 
         for _ in range(data['food']):
             farmland._add_token(token.Food(gui))
+        farmland._rng_from_dict(data)
         return farmland
 
 
 class Factory(Transition):
     """Factory type transition. Produces products."""
 
+    gui_properties = {'lable': 'Factory', 'color': '#6666ff'}
+    worker_priority = worker_index.HEALTHIEST
     base_production_time = 1
     production_time_multiplier = 0.02
     death_rate = 0.01
@@ -345,17 +486,15 @@ class Factory(Transition):
         """Inititalize factory."""
         super().__init__(gui, arc)
 
-    def _create_gui_component(self):
-        """Create a red transition gui component."""
-        parameters = {'lable': 'Factory', 'color': '#6666ff'}
-        self.lock()
-        self._gui_component = self._gui.create_transition_ui(parameters)
-        self.release()
+    @classmethod
+    def incident_risk(cls):
+        """Overrides from Transition. Return the risk of death."""
+        return Factory.death_rate
 
     def _get_tokens(self):
         """Fetch a worker."""
         if not self._find_token(token.Worker):
-            if worker := self._arc.get_worker():
+            if worker := (yield from self._arc.get_worker(self.get_worker_priority)):
                 self._add_token(worker)
         return bool(self._find_token(token.Worker))
 
@@ -368,31 +507,34 @@ class Factory(Transition):
         production_time = (Factory.base_production_time
                            + (token.Worker.max_health - worker.health)
                            * Factory.production_time_multiplier)
-        self._timer.wait(production_time)
-        self._add_token(token.Product(self._gui))
-        worker.decrease_health(random.randint(
+        yield production_time
+        self._add_token(self._arc.get_token_pool.acquire(token.Product))
+        worker.decrease_health(self._rng.randint(
             Factory.min_damage, Factory.max_damage))
-        if random.random() < Factory.death_rate:
-            self._remove_token(worker)
+        if self._rng.random() < Factory.death_rate:
+            self._incidents += 1
+            self._discard_token(worker)
 
     def _release_tokens(self):
         """Return tokens to their places."""
-        for token_ in self._tokens:
+        # A token stays held while it is carried, _store_token hands it
+        # over to its place
+        for token_ in list(self._tokens):
             self.lock()
             token_.lock()
-            self._gui_component.remove_token(token_.get_gui_component)
+            self._remove_token_ui(token_)
             token_.release()
             self.release()
             if isinstance(token_, token.Worker):
-                self._arc.store_worker(token_)
+                yield from self._store_token(self._arc.store_worker, token_)
             elif isinstance(token_, token.Product):
-                self._arc.store_product(token_)
-        self._tokens = []
+                yield from self._store_token(self._arc.store_product, token_)
 
     def to_dict(self):
         """Serialize factory to a dictionary."""
         data = {
             'type': 'factory',
+            'rng': self._rng_to_dict(),
             'worker': None,
             'products': 0,
         }
@@ -412,6 +554,7 @@ class Factory(Transition):
 
         for _ in range(data['products']):
             factory._add_token(token.Product(gui))
+        factory._rng_from_dict(data)
         return factory
 
 
@@ -422,3 +565,7 @@ class ApartmentMode(Enum):
     NEUTRAL = 1
     REST = 2
     MULTIPLY = 3
+
+
+# Every transition type, in the order adapt policies and reports use
+TRANSITION_TYPES = [Farmland, Foodcourt, Factory, Apartment]
@@ -0,0 +1,243 @@
+"""Module for variance reduced estimates from ensemble runs.
+
+Three techniques are combined, each is used when the runs allow it:
+
+- Common random numbers: parameter sets run with the same seeds are
+  compared seed by seed, so noise both runs share cancels.
+- Antithetic streams: a run and its antithetic twin with the same seed
+  are averaged into one observation.
+- Control variates: the incidents of a transition minus the number
+  expected from its firings have a known mean of 0, the part of a result
+  they explain is removed by regression.
+
+How much the reductions gain depends on the table. Runs are driven by
+threads, so thread scheduling makes two runs with the same seed drift
+apart, which weakens the pairing of common random numbers and
+antithetic twins. A reduced interval can then be wider than the plain
+one, compare both before relying on either.
+
+Run as a script on a table written by ensemble.py, for example:
+
+    python variance.py runs.csv --field mean_population --width 0.5
+"""
+import argparse
+import csv
+from math import pi, sqrt, tan
+from statistics import NormalDist
+
+import numpy as np
+
+import ensemble
+
+
+def t_quantile(confidence, dof):
+    """Return the two sided quantile of Student's t distribution.
+
+    The quantile is exact for 1 and 2 degrees of freedom. From 3 on it
+    uses the Cornish-Fisher expansion of the normal quantile, which is
+    within 0.01 of the exact value up to 95% confidence, at 99% from 4
+    degrees of freedom. Below the exact value it narrows the interval.
+    """
+    if dof < 1:
+        raise ValueError(f'Need at least 1 degree of freedom, got {dof}')
+    if dof == 1:
+        return tan(pi * confidence / 2)
+    if dof == 2:
+        return confidence * sqrt(2 / (1 - confidence**2))
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    terms = [(z**3 + z) / 4,
+             (5*z**5 + 16*z**3 + 3*z) / 96,
+             (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / 384,
+             (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / 92160]
+    return z + sum(term / dof**power for power, term in enumerate(terms, 1))
+
+
+def observations(runs, field, controls=ensemble.CONTROL_FIELDS):
+    """Return the values of field and the controls per seed.
+
+    Runs with the same seed, a run and its antithetic twin, are averaged
+    into one observation. Return a dict seed -> (value, control values).
+    """
+    by_seed = {}
+    for run in runs:
+        by_seed.setdefault(run['seed'], []).append(run)
+    return {seed: (np.mean([run[field] for run in seed_runs]),
+                   np.mean([[run[name] for name in controls]
+                            for run in seed_runs], axis=0))
+            for seed, seed_runs in by_seed.items()}
+
+
+def estimate(values, controls=None, confidence=0.95):
+    """Return the mean, its confidence half width and the controls used.
+
+    controls is an array with one row of zero mean control values per
+    value. The mean is corrected by the regression of values on them.
+    Controls that never varied are left out, and if there are too few
+    values to fit the rest, none are used.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if controls is None or not np.size(controls):
+        controls = np.zeros((n, 0))
+    controls = np.asarray(controls, dtype=float).reshape(n, -1)
+    # Controls that never varied explain nothing and would make the
+    # regression singular
+    controls = controls[:, np.ptp(controls, axis=0) > 0]
+    if n - 1 - controls.shape[1] < 1:
+        controls = controls[:, :0]
+    dof = n - 1 - controls.shape[1]
+    if dof < 1:
+        raise ValueError(f'{n} observations are too few for an interval')
+    if controls.shape[1]:
+        centered = controls - controls.mean(axis=0)
+        beta, *_ = np.linalg.lstsq(centered, values - values.mean(),
+                                   rcond=None)
+        # The controls have a known mean of 0, their sample mean is noise
+        mean = values.mean() - controls.mean(axis=0) @ beta
+        residuals = values - values.mean() - centered @ beta
+    else:
+        mean = values.mean()
+        residuals = values - mean
+    std_error = np.sqrt(residuals @ residuals / dof / n)
+    return (float(mean), float(t_quantile(confidence, dof) * std_error),
+            controls.shape[1])
+
+
+def summarize(runs, field, confidence=0.95, use_controls=True):
+    """Return the estimate of field over runs of one parameter set.
+
+    Return a dict with the mean, the half width of the confidence
+    interval, the number of runs and of observations it is based on and
+    the number of controls used.
+    """
+    seeds = observations(runs, field)
+    values = [value for value, _ in seeds.values()]
+    controls = ([control for _, control in seeds.values()]
+                if use_controls else None)
+    mean, half_width, used = estimate(values, controls, confidence)
+    return {'mean': mean, 'half_width': half_width, 'runs': len(runs),
+            'observations': len(seeds), 'controls': used}
+
+
+def compare(baseline, candidate, field, confidence=0.95, use_controls=True):
+    """Return the estimated difference of field from baseline to candidate.
+
+    Runs are paired by seed, seeds missing in either set are left out.
+    Return a dict like summarize.
+    """
+    base = observations(baseline, field)
+    other = observations(candidate, field)
+    seeds = [seed for seed in other if seed in base]
+    if not seeds:
+        raise ValueError('The parameter sets share no seeds')
+    differences = [other[seed][0] - base[seed][0] for seed in seeds]
+    controls = ([other[seed][1] - base[seed][1] for seed in seeds]
+                if use_controls else None)
+    mean, half_width, used = estimate(differences, controls, confidence)
+    runs = sum(1 for run in baseline + candidate if run['seed'] in seeds)
+    return {'mean': mean, 'half_width': half_width, 'runs': runs,
+            'observations': len(seeds), 'controls': used}
+
+
+def compare_independent(baseline, candidate, field, confidence=0.95):
+    """Return the difference of field as if the runs were independent.
+
+    This is what the comparison costs without common random numbers,
+    antithetic streams or controls. Return a dict like summarize.
+    """
+    base = summarize(baseline, field, confidence, False)
+    other = summarize(candidate, field, confidence, False)
+    return {'mean': other['mean'] - base['mean'],
+            'half_width': float(np.hypot(base['half_width'],
+                                         other['half_width'])),
+            'runs': base['runs'] + other['runs'],
+            'observations': base['observations'] + other['observations'],
+            'controls': 0}
+
+
+def runs_needed(result, width):
+    """Return the number of runs for a confidence interval of half width width."""
+    if not result['half_width']:
+        return result['runs']
+    return int(np.ceil(result['runs'] * (result['half_width'] / width)**2))
+
+
+def load_runs(path):
+    """Read an ensemble table and return its runs with numeric values."""
+    def convert(value):
+        if value in ('True', 'False'):
+            return value == 'True'
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+    with open(path, newline='', encoding='utf-8') as f:
+        return [{key: convert(value) for key, value in row.items()}
+                for row in csv.DictReader(f)]
+
+
+def group_runs(runs):
+    """Return the runs grouped by their parameter set, in order of appearance."""
+    groups = {}
+    for run in runs:
+        parameters = tuple((key, value) for key, value in run.items()
+                           if key not in ensemble.SUMMARY_FIELDS)
+        groups.setdefault(parameters, []).append(run)
+    return groups
+
+
+def _format(result, width, use_controls=False):
+    """Return a result as one line of text."""
+    line = (f'{result["mean"]:.4g} +- {result["half_width"]:.3g} '
+            f'({result["runs"]} runs')
+    if use_controls and not result['controls']:
+        line += ', without controls'
+    line += ')'
+    if width:
+        line += f', {runs_needed(result, width)} runs for +- {width:g}'
+    return line
+
+
+def _report(label, estimator, width, use_controls=False):
+    """Print the result of estimator, or why there is none."""
+    try:
+        text = _format(estimator(), width, use_controls)
+    except ValueError as error:
+        text = f'no estimate, {error}'
+    print(label, text)
+
+
+def main():
+    """Parse arguments and print plain and variance reduced estimates."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('table', help='CSV table written by ensemble.py')
+    parser.add_argument('--field', default='mean_population',
+                        help='summary field to estimate')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--width', type=float,
+                        help='target half width to estimate the runs needed for')
+    args = parser.parse_args()
+
+    groups = list(group_runs(load_runs(args.table)).items())
+    baseline = None
+    for parameters, runs in groups:
+        name = ', '.join(f'{key}={value:g}' for key, value in parameters)
+        plain = [run for run in runs if not run['antithetic']]
+        print(name or 'default parameters')
+        _report('  plain:   ', lambda: summarize(
+            plain, args.field, args.confidence, False), args.width)
+        _report('  reduced: ', lambda: summarize(
+            runs, args.field, args.confidence), args.width, True)
+        if baseline is not None:
+            _report('  vs first, plain:  ', lambda: compare_independent(
+                baseline[1], plain, args.field, args.confidence), args.width)
+            _report('  vs first, reduced:', lambda: compare(
+                baseline[0], runs, args.field, args.confidence),
+                args.width, True)
+        else:
+            baseline = (runs, plain)
+
+
+if __name__ == '__main__':
+    main()
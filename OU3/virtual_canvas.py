@@ -0,0 +1,314 @@
+"""Module for a canvas that keeps its items in memory instead of in Tk.
+
+The canvas implements the part of the Tk canvas interface that the gui
+drawers use, and renders its items as SVG or as PNG with a small pure
+Python rasterizer, so frames can be drawn without a display.
+"""
+import struct
+import zlib
+from itertools import count
+from math import sqrt
+from threading import RLock
+from xml.sax.saxutils import escape
+
+# Tk's default arrow shape for lines: distance from the tip to the neck,
+# distance from the tip to the wing tips and width outside the line
+ARROW_SHAPE = (8, 10, 3)
+NAMED_COLORS = {'black': (0, 0, 0), 'white': (255, 255, 255)}
+
+
+def parse_color(color):
+    """Return the (r, g, b) of a #rgb or #rrggbb color, None if color is empty."""
+    if not color:
+        return None
+    if color in NAMED_COLORS:
+        return NAMED_COLORS[color]
+    digits = color.lstrip('#')
+    if len(digits) == 3:
+        digits = ''.join(digit * 2 for digit in digits)
+    if not color.startswith('#') or len(digits) != 6:
+        raise ValueError(f'Unknown color {color}')
+    return tuple(int(digits[i:i+2], 16) for i in (0, 2, 4))
+
+
+def arrow_head(x0, y0, x1, y1, width):
+    """Return the neck and the polygon of an arrow pointing at (x1, y1)."""
+    length = sqrt((x1 - x0)**2 + (y1 - y0)**2) or 1
+    ux, uy = (x0 - x1) / length, (y0 - y1) / length
+    neck, tip, side = ARROW_SHAPE
+    wing = width / 2 + side
+    polygon = [(x1, y1),
+               (x1 + ux*tip - uy*wing, y1 + uy*tip + ux*wing),
+               (x1 + ux*neck, y1 + uy*neck),
+               (x1 + ux*tip + uy*wing, y1 + uy*tip - ux*wing)]
+    return (x1 + ux*neck, y1 + uy*neck), polygon
+
+
+def line_geometry(coords, width, arrow):
+    """Return the end points of a line shortened for its arrows and the arrow polygons."""
+    x0, y0, x1, y1 = coords
+    heads = []
+    if arrow in ('last', 'both'):
+        (x1, y1), polygon = arrow_head(coords[0], coords[1],
+                                       coords[2], coords[3], width)
+        heads.append(polygon)
+    if arrow in ('first', 'both'):
+        (x0, y0), polygon = arrow_head(coords[2], coords[3],
+                                       coords[0], coords[1], width)
+        heads.append(polygon)
+    return (x0, y0, x1, y1), heads
+
+
+class CanvasItem():
+    """An item on a VirtualCanvas."""
+
+    def __init__(self, kind, coords, options):
+        """Initialize item."""
+        self.kind = kind
+        self.coords = list(coords)
+        self.options = options
+
+
+class VirtualCanvas():
+    """An in-memory canvas with the interface of a Tk canvas used by the drawers.
+
+    Items are kept in stacking order, the first item is drawn first.
+    All methods are thread safe, so simulation threads can draw while
+    another thread renders frames.
+    """
+
+    background = '#ffffff'
+
+    def __init__(self, width=700, height=700):
+        """Initialize an empty canvas of width x height pixels."""
+        self._width = width
+        self._height = height
+        self._items = {}
+        self._ids = count(1)
+        self._lock = RLock()
+
+    def winfo_width(self):
+        """Return the width of the canvas."""
+        return self._width
+
+    def winfo_height(self):
+        """Return the height of the canvas."""
+        return self._height
+
+    def update(self):
+        """Do nothing, there is no window to update."""
+
+    def _create(self, kind, coords, options):
+        """Add an item on top of the others and return its id."""
+        with self._lock:
+            item_id = next(self._ids)
+            self._items[item_id] = CanvasItem(kind, coords, options)
+        return item_id
+
+    def create_oval(self, *coords, **options):
+        """Create an oval within the bounding box coords."""
+        return self._create('oval', coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        """Create a rectangle with the corners coords."""
+        return self._create('rectangle', coords, options)
+
+    def create_line(self, *coords, **options):
+        """Create a line between the points coords."""
+        return self._create('line', coords, options)
+
+    def create_text(self, *coords, **options):
+        """Create a text centered on coords."""
+        return self._create('text', coords, options)
+
+    def coords(self, item_id, coords):
+        """Move an item to new coordinates."""
+        with self._lock:
+            self._items[item_id].coords = list(coords)
+
+    def itemconfig(self, item_id, **options):
+        """Change options of an item."""
+        with self._lock:
+            self._items[item_id].options.update(options)
+
+    def delete(self, item_id):
+        """Remove an item."""
+        with self._lock:
+            self._items.pop(item_id, None)
+
+    def tag_raise(self, item_id):
+        """Move an item to the top of the stacking order."""
+        with self._lock:
+            self._items[item_id] = self._items.pop(item_id)
+
+    def tag_lower(self, item_id):
+        """Move an item to the bottom of the stacking order."""
+        with self._lock:
+            item = self._items.pop(item_id)
+            self._items = {item_id: item, **self._items}
+
+    def snapshot(self):
+        """Return copies of the items in stacking order."""
+        with self._lock:
+            return [CanvasItem(item.kind, item.coords, dict(item.options))
+                    for item in self._items.values()]
+
+    def to_svg(self):
+        """Return the canvas as an SVG document."""
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" '
+                 f'width="{self._width}" height="{self._height}">',
+                 f'<rect width="100%" height="100%" '
+                 f'fill="{VirtualCanvas.background}"/>']
+        for item in self.snapshot():
+            parts.extend(_svg_item(item))
+        parts.append('</svg>')
+        return '\n'.join(parts)
+
+    def to_png(self):
+        """Return the canvas as PNG bytes. Text is not rasterized."""
+        raster = Raster(self._width, self._height,
+                        parse_color(VirtualCanvas.background))
+        for item in self.snapshot():
+            raster.draw_item(item)
+        return raster.to_png()
+
+
+def _svg_item(item):
+    """Return the SVG elements of a canvas item."""
+    options = item.options
+    fill = options.get('fill') or 'none'
+    outline = options.get('outline') or 'none'
+    width = options.get('width', 1)
+    if item.kind in ('oval', 'rectangle'):
+        x0, y0, x1, y1 = item.coords
+        style = f'fill="{fill}" stroke="{outline}" stroke-width="{width}"'
+        if item.kind == 'oval':
+            return [f'<ellipse cx="{(x0 + x1) / 2:.1f}" cy="{(y0 + y1) / 2:.1f}" '
+                    f'rx="{abs(x1 - x0) / 2:.1f}" ry="{abs(y1 - y0) / 2:.1f}" '
+                    f'{style}/>']
+        return [f'<rect x="{min(x0, x1):.1f}" y="{min(y0, y1):.1f}" '
+                f'width="{abs(x1 - x0):.1f}" height="{abs(y1 - y0):.1f}" '
+                f'{style}/>']
+    if item.kind == 'line':
+        (x0, y0, x1, y1), heads = line_geometry(item.coords, width,
+                                                options.get('arrow'))
+        elements = [f'<line x1="{x0:.1f}" y1="{y0:.1f}" x2="{x1:.1f}" '
+                    f'y2="{y1:.1f}" stroke="{fill}" stroke-width="{width}"/>']
+        for polygon in heads:
+            points = ' '.join(f'{x:.1f},{y:.1f}' for x, y in polygon)
+            elements.append(f'<polygon points="{points}" fill="{fill}"/>')
+        return elements
+    if item.kind == 'text':
+        family, size = options.get('font', ('Arial', 7))[:2]
+        return [f'<text x="{item.coords[0]:.1f}" y="{item.coords[1]:.1f}" '
+                f'font-family="{family}" font-size="{size}pt" fill="{fill}" '
+                f'text-anchor="middle" dominant-baseline="central">'
+                f'{escape(str(options.get("text", "")))}</text>']
+    return []
+
+
+class Raster():
+    """An RGB pixel buffer that canvas items are drawn into."""
+
+    def __init__(self, width, height, background):
+        """Initialize a raster filled with the background color."""
+        self._width = width
+        self._height = height
+        self._pixels = bytearray(bytes(background) * (width * height))
+
+    def _span(self, y, x0, x1, color):
+        """Fill the pixels from x0 to x1, inclusive, on row y."""
+        if not 0 <= y < self._height:
+            return
+        x0, x1 = max(0, int(round(x0))), min(self._width - 1, int(round(x1)))
+        if x0 > x1:
+            return
+        start = (y * self._width + x0) * 3
+        self._pixels[start:start + (x1 - x0 + 1) * 3] = (
+            bytes(color) * (x1 - x0 + 1))
+
+    def fill_ellipse(self, x0, y0, x1, y1, color):
+        """Fill the ellipse within a bounding box."""
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        rx, ry = abs(x1 - x0) / 2, abs(y1 - y0) / 2
+        if rx <= 0 or ry <= 0:
+            return
+        for y in range(int(cy - ry), int(cy + ry) + 1):
+            dy = (y + 0.5 - cy) / ry
+            if abs(dy) <= 1:
+                half = rx * sqrt(1 - dy * dy)
+                self._span(y, cx - half, cx + half - 1, color)
+
+    def fill_rectangle(self, x0, y0, x1, y1, color):
+        """Fill the rectangle with the corners (x0, y0) and (x1, y1)."""
+        for y in range(int(round(min(y0, y1))), int(round(max(y0, y1)))):
+            self._span(y, min(x0, x1), max(x0, x1) - 1, color)
+
+    def fill_polygon(self, points, color):
+        """Fill a polygon with the even-odd rule."""
+        ys = [y for _, y in points]
+        for y in range(int(min(ys)), int(max(ys)) + 1):
+            scan = y + 0.5
+            crossings = []
+            for (xa, ya), (xb, yb) in zip(points, points[1:] + points[:1]):
+                if (ya <= scan) != (yb <= scan):
+                    crossings.append(xa + (scan - ya) * (xb - xa) / (yb - ya))
+            crossings.sort()
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                self._span(y, left, right - 1, color)
+
+    def draw_line(self, x0, y0, x1, y1, width, color):
+        """Draw a line of width pixels as a filled polygon."""
+        length = sqrt((x1 - x0)**2 + (y1 - y0)**2)
+        if not length:
+            return
+        nx, ny = -(y1 - y0) / length * width / 2, (x1 - x0) / length * width / 2
+        self.fill_polygon([(x0 + nx, y0 + ny), (x1 + nx, y1 + ny),
+                           (x1 - nx, y1 - ny), (x0 - nx, y0 - ny)], color)
+
+    def draw_item(self, item):
+        """Draw a canvas item, text is skipped."""
+        options = item.options
+        fill = parse_color(options.get('fill'))
+        if item.kind in ('oval', 'rectangle'):
+            x0, y0, x1, y1 = item.coords
+            x0, x1 = min(x0, x1), max(x0, x1)
+            y0, y1 = min(y0, y1), max(y0, y1)
+            fill_shape = (self.fill_ellipse if item.kind == 'oval'
+                          else self.fill_rectangle)
+            outline = parse_color(options.get('outline'))
+            width = options.get('width', 1)
+            if outline and width:
+                # The outline is centered on the border like in Tk
+                half = width / 2
+                fill_shape(x0 - half, y0 - half, x1 + half, y1 + half, outline)
+                x0, y0, x1, y1 = x0 + half, y0 + half, x1 - half, y1 - half
+            if fill:
+                fill_shape(x0, y0, x1, y1, fill)
+        elif item.kind == 'line' and fill:
+            width = options.get('width', 1)
+            (x0, y0, x1, y1), heads = line_geometry(item.coords, width,
+                                                    options.get('arrow'))
+            self.draw_line(x0, y0, x1, y1, width, fill)
+            for polygon in heads:
+                self.fill_polygon(polygon, fill)
+
+    def to_png(self):
+        """Return the raster encoded as PNG bytes."""
+        row_bytes = self._width * 3
+        scanlines = b''.join(
+            b'\x00' + bytes(self._pixels[y*row_bytes:(y + 1)*row_bytes])
+            for y in range(self._height))
+        return b''.join([
+            b'\x89PNG\r\n\x1a\n',
+            _png_chunk(b'IHDR', struct.pack('>IIBBBBB', self._width,
+                                            self._height, 8, 2, 0, 0, 0)),
+            _png_chunk(b'IDAT', zlib.compress(scanlines, 1)),
+            _png_chunk(b'IEND', b''),
+        ])
+
+
+def _png_chunk(kind, data):
+    """Return a PNG chunk with its length and checksum."""
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
@@ -0,0 +1,96 @@
+"""Module for an index of workers ordered by arrival and by health."""
+import heapq
+from collections import deque
+from itertools import count
+
+OLDEST = 'oldest'
+HEALTHIEST = 'healthiest'
+WEAKEST = 'weakest'
+
+
+class WorkerIndex():
+    """Workers that can be popped oldest, healthiest or weakest first.
+
+    Every worker is kept in a FIFO queue and in two heaps keyed on health.
+    A pop from one of them only marks the entry as stale in the other two,
+    stale entries are dropped when they reach the front, so pushes and
+    pops are amortized O(log n). A worker's health must not change while
+    indexed.
+    """
+
+    def __init__(self):
+        """Initialize worker index."""
+        self._sequence = count()
+        self._oldest = deque()
+        self._healthiest = []
+        self._weakest = []
+        # Sequence number -> number of structures still holding the entry
+        self._stale = {}
+        self._size = 0
+
+    def __len__(self):
+        """Return the number of workers."""
+        return self._size
+
+    def __iter__(self):
+        """Iterate over the workers, oldest first.
+
+        The workers are copied at once, so other threads may push and pop
+        while the copy is iterated.
+        """
+        oldest, stale = list(self._oldest), set(self._stale)
+        return (worker for seq, worker in oldest if seq not in stale)
+
+    def push(self, worker):
+        """Add a worker."""
+        seq = next(self._sequence)
+        self._oldest.append((seq, worker))
+        heapq.heappush(self._healthiest, (-worker.get_health, seq, worker))
+        heapq.heappush(self._weakest, (worker.get_health, seq, worker))
+        self._size += 1
+
+    def pop(self, priority=OLDEST):
+        """Remove and return the oldest, healthiest or weakest worker.
+
+        Raise IndexError if there are no workers.
+        """
+        if not self._size:
+            raise IndexError('pop from empty WorkerIndex')
+        if priority == OLDEST:
+            seq, worker = self._pop_live(self._oldest.popleft)
+        elif priority == HEALTHIEST:
+            _, seq, worker = self._pop_live(
+                lambda: heapq.heappop(self._healthiest))
+        elif priority == WEAKEST:
+            _, seq, worker = self._pop_live(
+                lambda: heapq.heappop(self._weakest))
+        else:
+            raise ValueError(f'Unknown priority {priority}')
+        self._stale[seq] = 2
+        self._size -= 1
+        if len(self._stale) > 2 * self._size + 64:
+            self._compact()
+        return worker
+
+    def _compact(self):
+        """Rebuild all structures without their stale entries."""
+        self._oldest = deque(entry for entry in self._oldest
+                             if entry[-2] not in self._stale)
+        self._healthiest = [entry for entry in self._healthiest
+                            if entry[-2] not in self._stale]
+        self._weakest = [entry for entry in self._weakest
+                         if entry[-2] not in self._stale]
+        heapq.heapify(self._healthiest)
+        heapq.heapify(self._weakest)
+        self._stale.clear()
+
+    def _pop_live(self, pop):
+        """Pop entries with pop until one that is not stale is found."""
+        while True:
+            entry = pop()
+            seq = entry[-2]
+            if seq not in self._stale:
+                return entry
+            self._stale[seq] -= 1
+            if not self._stale[seq]:
+                del self._stale[seq]